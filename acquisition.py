@@ -0,0 +1,380 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import serial
+from sensor_interface import FRAME_FIELDS, parse_line, format_command
+from connection_manager import (Backoff, PortWatcher, DISCONNECTED, CONNECTING,
+                                CONNECTED, RECONNECTING)
+
+class Device:
+    def __init__(self, name, port, baud_rate=115200, fields=None, retry_initial=False):
+        self.name = name
+        self.port = port
+        self.baud_rate = baud_rate
+        # Channels carried by each line from this device, in column order
+        self.fields = list(FRAME_FIELDS if fields is None else fields)
+        self.min_fields = 6 if fields is None else len(self.fields)
+        self.retry_initial = retry_initial
+        self.state = DISCONNECTED
+        self.last_time = 0.0
+        self.frames = 0
+        self.dropped_lines = 0
+        self.reconnects = 0
+        self.gaps = 0
+        self.wake = None
+        self.serial = None  # Open port while connected
+        self.outbox = None  # Queued command lines while connected
+        self.dropped_commands = 0
+
+    def __repr__(self):
+        return f"Device({self.name!r}, {self.port!r}, {self.baud_rate})"
+
+def parse_device_spec(spec):
+    # "name=PORT[@baud][:field,field,...]", e.g. "imu=COM4@230400:pitch,roll,yaw"
+    name, sep, rest = spec.partition('=')
+    if not sep or not name or not rest:
+        raise ValueError(f"Invalid device spec '{spec}', expected name=PORT[@baud][:fields]")
+    port, _, fields = rest.partition(':')
+    port, _, baud = port.partition('@')
+    return Device(name, port,
+                  baud_rate=int(baud) if baud else 115200,
+                  fields=fields.split(',') if fields else None)
+
+# Optional store channel flagging rows that came from simulate()
+SIMULATED = 'simulated'
+WRITE_TIMEOUT = 0.5  # Seconds a command write may block its executor thread
+OUTBOX_SIZE = 256    # Commands queued per device before older ones are dropped
+
+def _close_opened(future):
+    if not future.cancelled() and future.result() is not None:
+        future.result().close()
+
+class AcquisitionManager:
+    # Reads any number of serial devices concurrently from one asyncio event
+    # loop on a single background thread. Ports are opened non-blocking and
+    # polled, so no device can stall another. Each received line becomes a row
+    # in the TelemetryStore: the device's own channels plus the last values of
+    # every other device, all stamped with the same monotonic clock. Stages
+    # (e.g. fusion.FusionStage) fill derived channels of each block first.
+    # simulate(frame) feeds synthetic frames down the same path while no
+    # device is connected; if the store has a SIMULATED channel it is 1 on
+    # those rows and 0 on real ones, so every consumer can tell them apart.
+    def __init__(self, store, on_state=None, on_ports=None, poll_interval=0.002, stale_after=1.0,
+                 stages=()):
+        self.store = store
+        self.stages = list(stages)
+        for stage in self.stages:
+            stage.bind(store.index)
+        self.on_state = on_state
+        self.on_ports = on_ports
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        # Replaced, never changed in place: the loop, watcher and control
+        # threads iterate it while the GUI thread adds and removes devices
+        self.devices = {}
+        self._devices_lock = threading.Lock()
+        self.loop = None
+        self._thread = None
+        self._tasks = {}
+        self._latest = np.full(len(store.channels), np.nan)
+        self._simulated_idx = store.index.get(SIMULATED)
+        if self._simulated_idx is not None:
+            self._latest[self._simulated_idx] = 0.0
+        self.simulator = self._bind(Device('simulator', None))
+        self.watcher = PortWatcher(self._ports_changed)
+
+    def start(self):
+        if self._thread is None:
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop(self):
+        self.watcher.stop()
+        if self._thread is None:
+            return
+        with self._devices_lock:
+            self.devices = {}
+        # Let every device task close its port before the loop goes away
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout=2)
+        except Exception as e:
+            print(f"Error stopping acquisition: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
+        self._thread = None
+
+    async def _shutdown(self):
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def start_watching(self):
+        self.watcher.start()
+
+    def add_device(self, device):
+        self._bind(device)
+        self.start()
+        self.remove_device(device.name)
+        with self._devices_lock:
+            self.devices = {**self.devices, device.name: device}
+        self.loop.call_soon_threadsafe(self._start_task, device)
+        return device
+
+    def _bind(self, device):
+        unknown = [field for field in device.fields if field not in self.store.index]
+        if unknown:
+            raise ValueError(f"Unknown channels for device {device.name}: {unknown}")
+        device.indices = np.array([self.store.index[field] for field in device.fields])
+        # Stages whose inputs this device provides, directly or through an
+        # earlier stage (e.g. tracking a frequency of a derived channel)
+        available = set(device.fields)
+        device.stages = []
+        for stage in self.stages:
+            if set(stage.inputs) <= available:
+                device.stages.append(stage)
+                available.update(stage.outputs)
+        # Channels that go missing with this device, including derived ones
+        device.owned = np.concatenate([device.indices] + [
+            np.array(stage.output_idx, dtype=int) for stage in device.stages])
+        return device
+
+    def remove_device(self, name):
+        with self._devices_lock:
+            devices = dict(self.devices)
+            device = devices.pop(name, None)
+            self.devices = devices
+        if device is not None:
+            self.loop.call_soon_threadsafe(self._cancel_task, device)
+
+    # Single-port interface used by the GUI's port selector
+    def connect(self, port, name='main', **kwargs):
+        return self.add_device(Device(name, port, **kwargs))
+
+    def disconnect(self, name='main'):
+        self.remove_device(name)
+
+    def state(self, name='main'):
+        device = self.devices.get(name)
+        return device.state if device is not None else DISCONNECTED
+
+    def idle(self):
+        return all(device.state == DISCONNECTED for device in self.devices.values())
+
+    def simulate(self, frame):
+        # Publish one synthetic frame from the event loop thread, through the
+        # stages like a device line; it never becomes a held value
+        self.start()
+        self.loop.call_soon_threadsafe(self._publish, self.simulator, time.monotonic(), [frame])
+
+    def stats(self):
+        return {name: {'port': device.port, 'state': device.state, 'frames': device.frames,
+                       'dropped_lines': device.dropped_lines, 'reconnects': device.reconnects,
+                       'gaps': device.gaps, 'dropped_commands': device.dropped_commands}
+                for name, device in self.devices.items()}
+
+    def device_for(self, channel):
+        # Device currently providing a channel, used to route motor commands
+        for device in self.devices.values():
+            if channel in device.fields:
+                return device
+        return self.devices.get('main')
+
+    def channel_time(self, channel):
+        # Monotonic time of the last read from the device providing a
+        # channel, None while it is not connected
+        device = self.device_for(channel)
+        if device is None or device.state != CONNECTED or not device.frames:
+            return None
+        return device.last_time
+
+    def send(self, command, motor, value=0.0):
+        # Queue a motor command on the event loop thread; False if the
+        # motor's device is not connected
+        device = self.device_for(f"enc{motor}")
+        if device is None or device.state != CONNECTED:
+            return False
+        self.loop.call_soon_threadsafe(self._queue_write, device, format_command(command, motor, value))
+        return True
+
+    def _queue_write(self, device, data):
+        if device.outbox is None:
+            return
+        if device.outbox.full():
+            # The port is not keeping up; older commands are stale by now and
+            # the newest (possibly a torque off) must still go out
+            while not device.outbox.empty():
+                device.outbox.get_nowait()
+            device.dropped_commands += 1
+        device.outbox.put_nowait(data)
+
+    async def _write_device(self, device, port):
+        # Writes go out in order from an executor thread, so a stalled
+        # adapter holds up only its own commands, never the readers
+        while True:
+            data = await device.outbox.get()
+            try:
+                await self.loop.run_in_executor(None, port.write, data)
+            except serial.SerialTimeoutException:
+                device.dropped_commands += 1
+                print(f"Warning: write to {device.port} timed out, command dropped")
+            except (serial.SerialException, OSError) as e:
+                print(f"Error writing to {device.port}: {e}")
+
+    def _start_task(self, device):
+        device.wake = asyncio.Event()
+        self._tasks[device] = self.loop.create_task(self._run_device(device))
+
+    def _cancel_task(self, device):
+        task = self._tasks.pop(device, None)
+        if task is not None:
+            task.cancel()
+
+    def _set_state(self, device, state):
+        if device.state == state:
+            return
+        device.state = state
+        # A device that was replaced under the same name must not report
+        if self.on_state and self.devices.get(device.name, device) is device:
+            self.on_state(device.name, state)
+
+    def _ports_changed(self, ports, added, removed):
+        if self.on_ports:
+            self.on_ports(ports)
+        for device in list(self.devices.values()):
+            if device.port in added and device.wake is not None:
+                self.loop.call_soon_threadsafe(device.wake.set)
+
+    def _open(self, device, quiet):
+        # Runs in the loop's default executor, opening a port can block
+        try:
+            # timeout=0 makes reads return immediately with whatever is buffered
+            port = serial.Serial(device.port, device.baud_rate, timeout=0,
+                                 write_timeout=WRITE_TIMEOUT)
+            print(f"Successfully connected to {device.port}")
+            return port
+        except (serial.SerialException, OSError) as e:
+            if not quiet:
+                print(f"Warning: Could not connect to port {device.port}: {str(e)}")
+            return None
+
+    async def _run_device(self, device):
+        backoff = Backoff()
+        was_connected = False
+        attempts = 0
+        self._set_state(device, CONNECTING)
+        try:
+            while True:
+                opening = self.loop.run_in_executor(None, self._open, device, attempts > 0)
+                try:
+                    port = await asyncio.shield(opening)
+                except asyncio.CancelledError:
+                    # The port may still open after the device was removed
+                    opening.add_done_callback(_close_opened)
+                    raise
+                attempts += 1
+                if port is not None:
+                    if was_connected:
+                        device.reconnects += 1
+                    was_connected = True
+                    attempts = 0
+                    backoff.reset()
+                    device.serial = port
+                    device.outbox = asyncio.Queue(OUTBOX_SIZE)
+                    writer = self.loop.create_task(self._write_device(device, port))
+                    self._set_state(device, CONNECTED)
+                    try:
+                        await self._read_device(device, port)
+                    except (serial.SerialException, OSError) as e:
+                        print(f"Lost connection to {device.port}: {e}")
+                    finally:
+                        device.serial = None
+                        device.outbox = None
+                        writer.cancel()
+                        port.close()
+                    self._mark_gap(device)
+                elif not was_connected and not device.retry_initial:
+                    break
+
+                self._set_state(device, RECONNECTING)
+                device.wake.clear()
+                try:
+                    await asyncio.wait_for(device.wake.wait(), backoff.next())
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._latest[device.owned] = np.nan
+            self._set_state(device, DISCONNECTED)
+
+    async def _read_device(self, device, port):
+        pending = b''
+        while True:
+            waiting = port.in_waiting
+            if not waiting:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            t = time.monotonic()
+            pending += port.read(waiting)
+            *lines, pending = pending.split(b'\n')
+            if len(pending) > 4096:  # No line ending in sight, not our protocol
+                pending = b''
+                device.dropped_lines += 1
+
+            rows = []
+            for line in lines:
+                values = parse_line(line, len(device.fields), device.min_fields)
+                if values is None:
+                    device.dropped_lines += 1
+                else:
+                    rows.append(values)
+            if rows:
+                self._publish(device, t, rows)
+
+    def _publish(self, device, t, rows):
+        values = np.array(rows)
+        n = len(values)
+        out = np.repeat(self._latest[None, :], n, axis=0)
+        out[:, device.indices] = values
+        simulated = device is self.simulator
+        if not simulated:
+            self._latest[device.indices] = values[-1]
+        if self._simulated_idx is not None:
+            out[:, self._simulated_idx] = float(simulated)
+
+        # Lines that arrived in one read are spread evenly back towards the
+        # previous arrival instead of all sharing one timestamp, but never to
+        # before a row the store already holds from another device
+        times = np.full(n, t)
+        since = max(device.last_time, self.store.last_time)
+        if n > 1 and 0 < t - since and t - device.last_time < self.stale_after:
+            times -= (t - since) / n * np.arange(n - 1, -1, -1)
+        device.last_time = t
+        device.frames += n
+
+        # Run the stages whose inputs this device provides; rows from other
+        # devices carry the stage outputs forward through _latest
+        for stage in device.stages:
+            stage.process(times, out)
+            if not simulated:
+                self._latest[stage.output_idx] = out[-1, stage.output_idx]
+
+        # Channels of devices that went quiet are gaps, not held values
+        for other in self.devices.values():
+            if (other is not device and other.state == CONNECTED
+                    and t - other.last_time > self.stale_after):
+                out[:, other.owned] = np.nan
+
+        self.store.append_block(times, out)
+
+    def _mark_gap(self, device):
+        self._latest[device.owned] = np.nan
+        self.store.append(time.monotonic(), self._latest)
+        device.gaps += 1
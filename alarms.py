@@ -0,0 +1,227 @@
+import json
+import time
+from collections import deque
+import numpy as np
+
+# Limit monitoring on every block the store receives. Each rule watches one
+# channel, either its value or its rate of change (units per second), against
+# a high and/or low limit. The rate is the least-squares slope over the last
+# rate_window seconds, so sample-to-sample noise does not read as a fast
+# change. A breach sets the rule, it clears only once the
+# signal is back inside the limits by the hysteresis margin, and it raises an
+# alarm after staying set for the debounce time. Rules are kept as arrays and
+# evaluated for all rules and samples of a block at once, so the cost of a
+# block does not grow with Python-level work per rule or motor.
+#
+# Actions: 'log' records the event; 'torque_off' also calls trip(motor) on
+# the acquisition thread, i.e. before the next block is read.
+
+ACTIONS = ['log', 'torque_off']
+
+class Rule:
+    def __init__(self, channel, high=None, low=None, rate=False, hysteresis=0.0, debounce=0.0,
+                 action='log', motor=None, name=None, rate_window=1.0):
+        if high is None and low is None:
+            raise ValueError(f"Rule on '{channel}' needs a high or low limit")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown alarm action '{action}'")
+        self.channel = channel
+        self.high = high
+        self.low = low
+        self.rate = rate  # Limits apply to the rate of change
+        if rate and rate_window <= 0:
+            raise ValueError(f"Rule on '{channel}' needs a positive rate window")
+        self.rate_window = rate_window  # Seconds the rate is fitted over
+        self.hysteresis = hysteresis
+        self.debounce = debounce  # Seconds the breach must last
+        self.action = action
+        # Motor to trip; by default the number at the end of the channel name
+        digits = channel[len(channel.rstrip('0123456789')):]
+        self.motor = motor if motor is not None else int(digits) if digits else None
+        if action == 'torque_off' and self.motor is None:
+            raise ValueError(f"Rule on '{channel}' needs a motor to turn off")
+        self.name = name or f"{channel} {'rate ' if rate else ''}" + \
+            " ".join(f"{sign} {limit:g}" for sign, limit in [('>', high), ('<', low)] if limit is not None)
+
+def per_motor(prefix, motors=(1, 2, 3), **kwargs):
+    # The same rule for each motor's channel, e.g. per_motor('temp', high=70)
+    return [Rule(f"{prefix}{motor}", motor=motor, **kwargs) for motor in motors]
+
+# Conservative defaults for the rig; the simulator stays well inside them
+DEFAULT_RULES = (per_motor('temp', high=70.0, hysteresis=5.0, debounce=1.0, action='torque_off')
+                 + per_motor('voltage', low=10.0, high=14.0, hysteresis=0.3, debounce=0.5,
+                             action='torque_off')
+                 + per_motor('torque', high=95.0, hysteresis=5.0, debounce=2.0)
+                 + per_motor('temp', high=2.0, rate=True, rate_window=5.0, hysteresis=0.5,
+                             debounce=2.0))
+
+def load_rules(path):
+    # JSON list of Rule arguments; "motors": [1, 2, 3] turns "channel" into a
+    # prefix and adds one rule per motor
+    with open(path) as f:
+        specs = json.load(f)
+    rules = []
+    for spec in specs:
+        spec = dict(spec)
+        if 'motors' in spec:
+            rules.extend(per_motor(spec.pop('channel'), **spec))
+        else:
+            rules.append(Rule(**spec))
+    return rules
+
+class AlarmEngine:
+    # Evaluates the rules as a store listener, on the thread that appends
+    # the data. Events are kept in memory (events) and, with log_path, appended
+    # to a CSV file as wall time, monotonic time, rule, state, value.
+    def __init__(self, store, rules=DEFAULT_RULES, trip=None, log_path=None, on_event=None,
+                 verbose=True):
+        unknown = [rule.channel for rule in rules if rule.channel not in store.index]
+        if unknown:
+            raise ValueError(f"Unknown channels: {unknown}")
+        self.store = store
+        self.rules = list(rules)
+        self.trip = trip  # trip(motor) turns a motor's torque off
+        self.log_path = log_path
+        self.on_event = on_event  # on_event(event), on the acquisition thread
+        self.verbose = verbose  # Print raised alarms
+        self.events = deque(maxlen=500)
+        self.trips = 0
+        self._log = None
+
+        n = len(self.rules)
+        self.columns = np.array([store.index[rule.channel] for rule in self.rules], dtype=int)
+        self.high = np.array([np.inf if rule.high is None else rule.high for rule in self.rules])
+        self.low = np.array([-np.inf if rule.low is None else rule.low for rule in self.rules])
+        self.rate = np.array([rule.rate for rule in self.rules], dtype=bool)
+        self.rate_window = np.array([rule.rate_window for rule in self.rules], dtype=float)
+        self.hysteresis = np.array([rule.hysteresis for rule in self.rules], dtype=float)
+        self.debounce = np.array([rule.debounce for rule in self.rules], dtype=float)
+        self.trips_motor = np.array([rule.action == 'torque_off' for rule in self.rules], dtype=bool)
+        # Rows from the simulator (acquisition.SIMULATED) never raise alarms
+        self.simulated_idx = store.index.get('simulated')
+
+        # State carried from one block to the next
+        self._history_times = np.empty(0)        # Samples still inside a rate window
+        self._history = np.empty((0, n))
+        self._set = np.zeros(n, dtype=bool)       # Breached, within hysteresis
+        self._since = np.full(n, np.nan)          # When the current breach began
+        self.active = np.zeros(n, dtype=bool)     # Breached for the debounce time
+        store.add_listener(self.evaluate)
+
+    def evaluate(self, times, rows):
+        if self.simulated_idx is not None:
+            real = rows[:, self.simulated_idx] != 1.0
+            if not real.all():
+                times, rows = times[real], rows[real]
+        n = len(times)
+        if n == 0 or len(self.rules) == 0:
+            return []
+        index = np.arange(n)[:, None]
+        values = rows[:, self.columns]
+
+        # Signal per rule: the value, or its rate of change
+        signal = np.where(self.rate, self._rates(times, values), values) if self.rate.any() else values
+
+        # Hysteresis: the state follows the latest breach (1) or clear (0)
+        # sample; NaN gaps and the band in between keep the previous state
+        breach = (signal > self.high) | (signal < self.low)
+        clear = (signal <= self.high - self.hysteresis) & (signal >= self.low + self.hysteresis)
+        decided = np.maximum.accumulate(np.where(breach | clear, index, -1), axis=0)
+        latest = np.take_along_axis(breach, np.maximum(decided, 0), axis=0)
+        state = np.where(decided >= 0, latest, self._set)
+
+        # Debounce: time since the state last went from clear to set
+        before = np.vstack([self._set, state[:-1]])
+        began = np.maximum.accumulate(np.where(state & ~before, index, -1), axis=0)
+        since = np.where(began >= 0, times[np.maximum(began, 0)], self._since)
+        active = state & (times[:, None] - since >= self.debounce)
+
+        prior = np.vstack([self.active, active[:-1]])
+        raised = active & ~prior
+        cleared = ~active & prior
+
+        self._set = state[-1]
+        self._since = since[-1]
+        self.active = active[-1]
+
+        if not (raised.any() or cleared.any()):
+            return []
+        samples, rules = np.nonzero(raised | cleared)
+        events = []
+        for i, r in sorted(zip(samples, rules)):
+            events.append({'time': float(times[i]), 'rule': self.rules[r].name,
+                           'channel': self.rules[r].channel, 'motor': self.rules[r].motor,
+                           'state': 'raised' if raised[i, r] else 'cleared',
+                           'value': float(signal[i, r]), 'action': self.rules[r].action})
+        tripping = rules[self.trips_motor[rules] & raised[samples, rules]]
+        self._handle(events, sorted({self.rules[r].motor for r in tripping}))
+        return events
+
+    def _rates(self, times, values):
+        # Least-squares slope at every sample over its rule's window, from
+        # prefix sums of the samples kept from earlier blocks plus this one
+        all_times = np.concatenate([self._history_times, times])
+        all_values = np.vstack([self._history, values])
+        tau = (all_times - all_times[-1])[:, None]  # Small numbers keep the sums exact
+        w = np.isfinite(all_values).astype(float)
+        y = np.where(w > 0, all_values, 0.0)
+        zero = np.zeros((1, values.shape[1]))
+        sums = [np.vstack([zero, np.cumsum(a, axis=0)])
+                for a in (w, w * tau, w * tau * tau, y, y * tau)]
+
+        end = np.arange(len(self._history_times), len(all_times)) + 1
+        rates = np.full(values.shape, np.nan)
+        for window in np.unique(self.rate_window[self.rate]):
+            columns = self.rate & (self.rate_window == window)
+            start = np.searchsorted(all_times, times - window, side='left')
+            n, st, stt, sy, sty = [(s[end] - s[start])[:, columns] for s in sums]
+            det = n * stt - st * st
+            # No rate until the samples span at least half the window
+            covered = (times - all_times[np.minimum(start, len(all_times) - 1)] >= window / 2)[:, None]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rates[:, columns] = np.where(covered & (n >= 2) & (det > 1e-12 * n * n),
+                                             (n * sty - st * sy) / det, np.nan)
+
+        keep = all_times > times[-1] - self.rate_window[self.rate].max()
+        self._history_times = all_times[keep]
+        self._history = all_values[keep]
+        return rates
+
+    def _handle(self, events, motors):
+        # Safety first: turn the motors off before logging anything
+        for motor in motors:
+            if self.trip is not None:
+                try:
+                    self.trip(motor)
+                except Exception as e:
+                    print(f"Error turning off motor {motor}: {e}")
+            self.trips += 1
+        offset = time.time() - time.monotonic()
+        for event in events:
+            self.events.append(event)
+            if self.verbose and event['state'] == 'raised':
+                action = ", torque off" if event['action'] == 'torque_off' else ""
+                print(f"Warning: alarm {event['rule']} (value {event['value']:.3g}){action}")
+            if self.log_path is not None:
+                if self._log is None:
+                    self._log = open(self.log_path, 'a', newline='')
+                wall = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(event['time'] + offset))
+                self._log.write(f"{wall},{event['time']:.6f},{event['rule']},{event['state']},"
+                                f"{event['value']:.6g}\n")
+            if self.on_event is not None:
+                self.on_event(event)
+        if self._log is not None:
+            self._log.flush()
+
+    def active_rules(self):
+        return [rule.name for rule, active in zip(self.rules, self.active) if active]
+
+    def stats(self):
+        return {'rules': len(self.rules), 'active': int(self.active.sum()),
+                'events': len(self.events), 'trips': self.trips}
+
+    def close(self):
+        self.store.remove_listener(self.evaluate)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -0,0 +1,258 @@
+import os
+import sys
+import queue
+import threading
+import multiprocessing
+import contextlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+# Heavy analysis off the GUI thread. Input snapshots are copied once into a
+# shared memory segment per job key and only the segment name travels to the
+# worker process; results (small: spectra, images) come back pickled.
+# Each key runs at most one job at a time and keeps only the newest pending
+# snapshot, so views that submit every frame never queue up stale work.
+# Pending snapshots are launched from submit() and drain() on the caller's
+# thread, never from the pool's own callback thread.
+
+def _run(func, name, shape, dtype, kwargs):
+    shm = shared_memory.SharedMemory(name)
+    try:
+        data = np.ndarray(shape, dtype, shm.buf)
+        try:
+            # Results must not be views of the input, the segment is reused
+            return func(data, **kwargs)
+        finally:
+            del data
+    finally:
+        shm.close()
+
+@contextlib.contextmanager
+def _worker_main():
+    # A spawned worker re-runs the parent's __main__ before its first job;
+    # for the GUI that is main.py and with it all of PyQt5. While the pool
+    # starts processes, name this Qt-free module as __main__ instead, so
+    # workers only import what the jobs need. Jobs must therefore be
+    # functions of importable modules, never of the running script.
+    main = sys.modules['__main__']
+    spec = getattr(main, '__spec__', None)
+    main.__spec__ = sys.modules[__name__].__spec__
+    try:
+        yield
+    finally:
+        main.__spec__ = spec
+
+class _Job:
+    def __init__(self):
+        self.generation = 0
+        self.accept_from = 0  # Results of older generations are discarded
+        self.future = None
+        self.pending = None
+        self.shm = None
+
+class AnalysisExecutor:
+    # Results are handed back by drain(), which the GUI calls from its own
+    # timer so callbacks run on the Qt thread. max_workers=0 runs jobs inline.
+    def __init__(self, max_workers=None):
+        self.max_workers = max(1, min(4, (os.cpu_count() or 2) - 1)) \
+            if max_workers is None else max_workers
+        self._pool = None
+        self._jobs = {}
+        self._results = queue.Queue()
+        # Reentrant: a job that finishes before add_done_callback() returns
+        # runs its callback right away on the submitting thread
+        self._lock = threading.RLock()
+        self._closed = False
+        self.submitted = 0
+        self.completed = 0
+        self.superseded = 0
+        self.failed = 0
+        self.broken_pools = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn everywhere: forking a process that runs Qt and serial
+            # threads is not safe
+            self._pool = ProcessPoolExecutor(self.max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def submit(self, key, func, data, callback, **kwargs):
+        # func must be a module-level function taking (data, **kwargs)
+        data = np.ascontiguousarray(data)
+        if self.max_workers == 0:
+            self._results.put((callback, func(data, **kwargs)))
+            return
+        with self._lock:
+            if self._closed:
+                return
+            job = self._jobs.setdefault(key, _Job())
+            job.generation += 1
+            self.submitted += 1
+            if job.pending is not None:
+                self.superseded += 1  # Never started, newer data replaces it
+            job.pending = (job.generation, func, data, callback, kwargs)
+            if job.future is None:
+                self._launch(key, job)
+
+    def cancel(self, key):
+        # Drop pending work and ignore the running job's result, e.g. after
+        # the view switched to another channel
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                job.pending = None
+                job.accept_from = job.generation + 1
+
+    def _launch(self, key, job):
+        generation, func, data, callback, kwargs = job.pending
+        job.pending = None
+        if self.max_workers == 0:
+            # The pool was given up on: run in-process on the caller's thread
+            self._run_inline(key, func, data, callback, kwargs)
+            return
+        if job.shm is None or job.shm.size < data.nbytes:
+            if job.shm is not None:
+                job.shm.close()
+                job.shm.unlink()
+            job.shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        np.ndarray(data.shape, data.dtype, job.shm.buf)[...] = data
+        try:
+            with _worker_main():
+                job.future = self._get_pool().submit(_run, func, job.shm.name, data.shape,
+                                                     data.dtype.str, kwargs)
+        except (BrokenProcessPool, RuntimeError, ValueError) as e:
+            # Broken pool, or one that cannot be created or was shut down
+            job.future = None
+            self._pool_broken()
+            if self.max_workers == 0:
+                self._run_inline(key, func, data, callback, kwargs)
+            else:
+                job.pending = job.pending or (generation, func, data, callback, kwargs)
+                print(f"Analysis job '{key}' could not be started: {e}")
+            return
+        job.future.add_done_callback(
+            lambda future: self._done(key, job, generation, callback, future))
+
+    def _done(self, key, job, generation, callback, future):
+        # Runs on the pool's management thread
+        with self._lock:
+            job.future = None
+            accepted = generation >= job.accept_from
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            with self._lock:
+                self._pool_broken()
+            return
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Analysis job '{key}' failed: {e}")
+            return
+        if accepted:
+            with self._lock:
+                self.completed += 1
+            self._results.put((callback, result))
+
+    def _run_inline(self, key, func, data, callback, kwargs):
+        try:
+            result = func(data, **kwargs)
+        except Exception as e:
+            self.failed += 1
+            print(f"Analysis job '{key}' failed: {e}")
+            return
+        self.completed += 1
+        self._results.put((callback, result))
+
+    def _pool_broken(self):
+        # A worker died (crash, out of memory) or the pool could not be used.
+        # Start a fresh pool for the next job; after repeated failures run
+        # jobs inline instead. Lock held.
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self.max_workers == 0:
+            return
+        self.broken_pools += 1
+        if self.broken_pools >= 3:
+            print("Analysis workers keep failing, running analysis in-process")
+            self.max_workers = 0
+        else:
+            print("Analysis worker pool failed, restarting it")
+
+    def drain(self):
+        # Start snapshots that waited for their key's previous job, then
+        # deliver finished results on the calling thread
+        with self._lock:
+            for key, job in self._jobs.items():
+                if job.pending is not None and job.future is None and not self._closed:
+                    self._launch(key, job)
+        delivered = 0
+        while True:
+            try:
+                callback, result = self._results.get_nowait()
+            except queue.Empty:
+                return delivered
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"Error handling analysis result: {e}")
+            delivered += 1
+
+    def stats(self):
+        return {'workers': self.max_workers, 'submitted': self.submitted,
+                'completed': self.completed, 'superseded': self.superseded,
+                'failed': self.failed,
+                'running': sum(job.future is not None for job in self._jobs.values())}
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        for job in jobs:
+            if job.shm is not None:
+                job.shm.close()
+                job.shm.unlink()
+
+# Analysis functions, run inside the worker processes
+
+_processors = {}
+
+def spectrum(samples, sample_rate, cutoff=20):
+    # One-sided windowed magnitude spectrum, (frequencies, magnitude)
+    key = (sample_rate, len(samples), cutoff)
+    if key not in _processors:
+        from fft_processor import FFTProcessor
+        _processors[key] = FFTProcessor(sample_rate, len(samples), cutoff)
+    frequencies, magnitude = _processors[key].process(samples)
+    half = len(samples) // 2
+    return frequencies[:half], magnitude[:half]
+
+def spectrogram(samples, sample_rate, segment=64, overlap=48):
+    # Short-time power spectrum in dB, (frequencies, times, power[freq, time])
+    from scipy.signal import spectrogram as short_time_spectrum
+    samples = np.where(np.isfinite(samples), samples, np.nanmean(samples))
+    frequencies, times, power = short_time_spectrum(
+        samples - samples.mean(), fs=sample_rate, window='hann',
+        nperseg=segment, noverlap=overlap)
+    return frequencies, times, 10 * np.log10(power + 1e-12)
+
+def orientation(block, fusion='madgwick'):
+    # Re-run orientation fusion over a recorded block with columns time,
+    # gx, gy, gz, ax, ay, az; returns (N, 3) roll, pitch, yaw in degrees
+    from fusion import FILTERS, quaternion_to_euler
+    valid = np.isfinite(block).all(axis=1)
+    out = np.full((len(block), 3), np.nan)
+    if valid.any():
+        rows = block[valid]
+        out[valid] = quaternion_to_euler(FILTERS[fusion]().update(rows[:, 0], rows[:, 1:4],
+                                                                  rows[:, 4:7]))
+    return out
@@ -0,0 +1,349 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Post-run analysis of recorded sessions: SessionLogger / motor-logger CSVs
+# ("time,<channel>,...") and the GUI's SAVE files ("Time,M1_Speed,...").
+# Files are split into byte ranges of whole lines and every range is
+# analysed by a worker process on its own, so no file is ever loaded in
+# full and large sessions use all cores. Per chunk results are mergeable
+# sums (moments, summed spectra), combined here once a file is complete.
+# Alarm replay needs the rules' hysteresis and debounce state in order, so
+# it streams each file's chunks through one AlarmEngine in a task of its own.
+#
+# Outputs per input file, in --out:
+#   <name>_summary.json  rows, duration, rate, per-channel statistics and
+#                        spectral peak, alarm counts
+#   <name>_windows.csv   mean/std/min/max per channel over --window seconds
+#   <name>_spectrum.csv  Welch power spectral density per channel, one-sided,
+#                        in squared channel units per Hz
+#   <name>_alarms.csv    replayed alarm events
+
+# Column names of the GUI's saveData export
+SAVE_COLUMNS = {'Time': 'time'}
+SAVE_COLUMNS.update({f"M{i}_{name}": f"{prefix}{i}" for i in range(1, 4)
+                     for name, prefix in [('Speed', 'speed'), ('Torque', 'torque'),
+                                          ('Temp', 'temp'), ('Voltage', 'voltage')]})
+WINDOW_STATS = ['mean', 'std', 'min', 'max']
+
+def read_header(path):
+    # Channel names of a log (without time) and the byte offset of the data
+    with open(path, 'rb') as f:
+        names = f.readline().decode().strip().split(',')
+        offset = f.tell()
+    names = [SAVE_COLUMNS.get(name, name) for name in names]
+    if names[0] != 'time':
+        raise ValueError(f"{path} does not start with a time column")
+    return names[1:], offset
+
+def plan_chunks(path, chunk_bytes):
+    # Byte ranges of whole lines, found by seeking rather than reading
+    _, start = read_header(path)
+    size = os.path.getsize(path)
+    bounds = [start]
+    with open(path, 'rb') as f:
+        while bounds[-1] < size:
+            f.seek(min(bounds[-1] + chunk_bytes, size))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _parse(lines, columns):
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        data = np.empty((0, len(columns) + 1))
+    else:
+        data = np.loadtxt(lines, delimiter=',', ndmin=2, usecols=[0] + [c + 1 for c in columns])
+    return data[:, 0], data[:, 1:]
+
+def read_chunk(path, start, stop, columns):
+    # (times, rows) of the lines in [start, stop); columns are indices into
+    # the channel list
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(stop - start).decode().splitlines()
+    return _parse(lines, columns)
+
+def read_lines(path, start, count, columns):
+    # (times, rows) of up to count lines from byte offset start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = [f.readline().decode() for _ in range(count)]
+    return _parse(lines, columns)
+
+def estimate_file_rate(path, lines=2000):
+    # (nominal rate, time of the first row)
+    from resampling import estimate_rate
+    _, start = read_header(path)
+    times, _ = read_lines(path, start, lines, [])
+    return estimate_rate(times), times[0] if len(times) else None
+
+def filter_runs(processor, uniform):
+    # Low-pass every finite run of every channel on its own, so a gap does
+    # not keep the rest of the channel unfiltered. Runs too short for the
+    # filter's edge padding are left as they are and counted.
+    padding = 3 * max(len(processor.a), len(processor.b))
+    skipped = 0
+    for values in uniform:
+        finite = np.concatenate([[0], np.isfinite(values).astype(np.int8), [0]])
+        edges = np.flatnonzero(np.diff(finite))
+        for a, b in zip(edges[::2], edges[1::2]):
+            if b - a > padding:
+                values[a:b] = processor.apply_filter(values[a:b])
+            else:
+                skipped += b - a
+    return skipped
+
+def analyse_chunk(path, start, stop, columns, rate, segment, window, lowpass, origin):
+    # Worker: moments, per-window moments and summed Welch segments of one
+    # chunk. Welch segments sit on one grid per file (from origin, the first
+    # row's time); a chunk owns the segments that start before the next
+    # chunk's first row and reads up to two segments of lines past its end
+    # to finish them, so the spectrum does not depend on the chunk size
+    # (up to the low-pass filter's edge transients at chunk starts).
+    from rolling_stats import block_moments
+    from resampling import resample
+    from fft_processor import FFTProcessor
+    times, rows = read_chunk(path, start, stop, columns)
+    result = {'rows': len(times), 'first': times[0] if len(times) else np.nan,
+              'last': times[-1] if len(times) else np.nan,
+              'moments': block_moments(rows) if len(times) else None, 'windows': {}}
+
+    # Windowed statistics, keyed by window number so windows that straddle
+    # two chunks merge afterwards
+    if len(times):
+        keys = np.floor(times / window).astype(np.int64)
+        for key in np.unique(keys):
+            result['windows'][int(key)] = block_moments(rows[keys == key])
+
+    # Welch: Hann windowed segments with 50% overlap on a uniform grid,
+    # skipping segments with gaps, using the live Spectrum tab's processor
+    processor = FFTProcessor(rate, segment, cutoff=lowpass or 20)
+    half = segment // 2
+    power = np.zeros((len(columns), half))
+    segments = np.zeros(len(columns))
+    result['unfiltered'] = 0
+    uniform = np.empty((0, len(columns)))
+    if len(times):
+        ahead_times, ahead_rows = read_lines(path, stop, 2 * segment, columns)
+        next_first = ahead_times[0] if len(ahead_times) else np.inf
+        # First segment start of the file's grid at or after this chunk's first row
+        first = origin + np.ceil((times[0] - origin) * rate / half - 1e-9) * half / rate
+        _, uniform = resample(np.concatenate([times, ahead_times]),
+                              np.vstack([rows, ahead_rows]), rate, start=first)
+    if len(uniform) >= segment:
+        uniform = uniform.T
+        if lowpass:
+            result['unfiltered'] = filter_runs(processor, uniform)
+        from numpy.lib.stride_tricks import sliding_window_view
+        parts = sliding_window_view(uniform, segment, axis=1)[:, ::half]  # (channels, segments, segment)
+        owned = first + np.arange(parts.shape[1]) * half / rate < next_first
+        valid = np.isfinite(parts).all(axis=-1) & owned
+        parts = np.where(valid[..., None], parts - parts.mean(axis=-1, keepdims=True), 0.0)
+        _, magnitude = processor.process(parts)
+        # magnitude is 2|X|/N; density is |X|^2 / (fs * sum(w^2)), doubled
+        # above DC for the one-sided spectrum, as scipy.signal.welch
+        # (scaling='density') computes it
+        density = magnitude[..., :half] ** 2 * segment ** 2 / (4 * rate * np.sum(processor.window ** 2))
+        density[..., 1:] *= 2
+        power = (density * valid[..., None]).sum(axis=1)
+        segments = valid.sum(axis=1).astype(float)
+    result['power'] = power
+    result['segments'] = segments
+    return result
+
+def replay_alarms(path, chunks, channels, rules_path):
+    # Worker: run the alarm rules over a whole file, one chunk at a time
+    from telemetry import TelemetryStore
+    from alarms import AlarmEngine, DEFAULT_RULES, load_rules
+    rules = DEFAULT_RULES if rules_path is None else load_rules(rules_path)
+    rules = [rule for rule in rules if rule.channel in channels]
+    store = TelemetryStore(channels, capacity=1, stats_windows=())
+    engine = AlarmEngine(store, rules, verbose=False)
+    events = []
+    for start, stop in chunks:
+        times, rows = read_chunk(path, start, stop, list(range(len(channels))))
+        events.extend(engine.evaluate(times, rows))
+    return events
+
+class FileAnalysis:
+    # Merges the chunk results of one file as they complete
+    def __init__(self, path, channels, rate, n_chunks, window):
+        from rolling_stats import Moments
+        self.path = path
+        self.channels = channels
+        self.rate = rate
+        self.window = window
+        self.pending = n_chunks
+        self.rows = 0
+        self.first = np.inf
+        self.last = -np.inf
+        self.total = Moments(len(channels))
+        self.windows = {}
+        self.power = 0.0
+        self.segments = 0.0
+        self.unfiltered = 0
+        self.events = None
+
+    def add(self, result):
+        from rolling_stats import merge
+        self.pending -= 1
+        self.rows += result['rows']
+        self.first = np.fmin(self.first, result['first'])
+        self.last = np.fmax(self.last, result['last'])
+        if result['moments'] is not None:
+            self.total.add(*result['moments'])
+        for key, moments in result['windows'].items():
+            if key not in self.windows:
+                self.windows[key] = moments
+                continue
+            count, mean, m2, low, high = self.windows[key]
+            merged = merge(count, mean, m2, *moments[:3])
+            self.windows[key] = merged + (np.fmin(low, moments[3]), np.fmax(high, moments[4]))
+        self.power = self.power + result['power']
+        self.segments = self.segments + result['segments']
+        self.unfiltered += result['unfiltered']
+
+    def done(self):
+        return self.pending == 0 and self.events is not None
+
+    def write(self, out_dir):
+        from rolling_stats import summarize
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        os.makedirs(out_dir, exist_ok=True)
+
+        keys = sorted(self.windows)
+        header = ','.join(['start'] + [f"{channel}_{stat}" for channel in self.channels
+                                       for stat in WINDOW_STATS])
+        table = np.empty((len(keys), 1 + len(WINDOW_STATS) * len(self.channels)))
+        for i, key in enumerate(keys):
+            stats = summarize(*self.windows[key])
+            table[i, 0] = key * self.window
+            table[i, 1:] = np.column_stack([stats[stat] for stat in WINDOW_STATS]).ravel()
+        np.savetxt(os.path.join(out_dir, f"{name}_windows.csv"), table, fmt='%.6g',
+                   delimiter=',', header=header, comments='')
+
+        segment = 2 * np.shape(self.power)[-1] if np.ndim(self.power) else 0
+        frequencies = np.arange(segment // 2) * self.rate / segment if segment else np.empty(0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            spectrum = np.atleast_2d(self.power / np.asarray(self.segments)[:, None]) \
+                if segment else np.empty((len(self.channels), 0))
+        np.savetxt(os.path.join(out_dir, f"{name}_spectrum.csv"),
+                   np.column_stack([frequencies, spectrum.T]), fmt='%.6g', delimiter=',',
+                   header=','.join(['frequency'] + self.channels), comments='')
+
+        with open(os.path.join(out_dir, f"{name}_alarms.csv"), 'w', newline='') as f:
+            f.write("time,rule,state,value\n")
+            for event in self.events:
+                f.write(f"{event['time']:.6f},{event['rule']},{event['state']},{event['value']:.6g}\n")
+
+        stats = self.total.summary()
+        summary = {'file': self.path, 'rows': self.rows,
+                   'duration': float(self.last - self.first) if self.rows else 0.0,
+                   'sample_rate': self.rate, 'unfiltered_samples': self.unfiltered, 'channels': {},
+                   'alarms': {'raised': sum(event['state'] == 'raised' for event in self.events),
+                              'rules': sorted({event['rule'] for event in self.events})}}
+        for c, channel in enumerate(self.channels):
+            info = {stat: float(stats[stat][c]) for stat in ['count', 'mean', 'rms', 'std',
+                                                             'min', 'max', 'ptp']}
+            if segment and self.segments[c] > 0:
+                # Strongest component above DC
+                peak = 1 + int(np.argmax(spectrum[c, 1:]))
+                info['peak_frequency'] = float(frequencies[peak])
+                info['peak_density'] = float(spectrum[c, peak])
+            # NaN is not valid JSON
+            summary['channels'][channel] = {key: (None if value != value else value)
+                                            for key, value in info.items()}
+        if self.unfiltered:
+            print(f"Warning: {self.path}: {self.unfiltered} samples in runs too short to low-pass were left unfiltered")
+        with open(os.path.join(out_dir, f"{name}_summary.json"), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Summarize recorded session logs: statistics, spectra and alarm replay")
+    parser.add_argument('paths', nargs='+', help="session CSV files or glob patterns")
+    parser.add_argument('--out', default='analysis', help="output directory")
+    parser.add_argument('--channels', help="comma separated channels (default all)")
+    parser.add_argument('--chunk-mb', type=float, default=16,
+                        help="size of the pieces each file is split into")
+    parser.add_argument('--workers', type=int, help="worker processes (default one per core)")
+    parser.add_argument('--rate', type=float,
+                        help="resampling rate in Hz for spectra (default measured per file)")
+    parser.add_argument('--segment', type=int, default=256, help="Welch segment length")
+    parser.add_argument('--lowpass', type=float,
+                        help="Butterworth low-pass cutoff in Hz applied before the spectra")
+    parser.add_argument('--window', type=float, default=10.0,
+                        help="seconds per row of windowed statistics")
+    parser.add_argument('--alarms', metavar='FILE',
+                        help="JSON alarm rules to replay instead of the defaults ('none' to skip)")
+    return parser
+
+def run(args):
+    paths = list(dict.fromkeys(path for pattern in args.paths
+                               for path in sorted(glob.glob(pattern)) or [pattern]))
+    started = time.monotonic()
+    files = {}
+    written = 0
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = {}
+        for path in paths:
+            try:
+                channels, _ = read_header(path)
+                chunks = plan_chunks(path, int(args.chunk_mb * 1e6))
+                rate, origin = estimate_file_rate(path)
+                rate = args.rate or rate
+            except (OSError, ValueError) as e:
+                print(f"Warning: skipping {path}: {e}")
+                continue
+            selected = channels if args.channels is None else \
+                [name for name in args.channels.split(',') if name in channels]
+            if rate is None or not selected:
+                print(f"Warning: skipping {path}: no usable data")
+                continue
+            columns = [channels.index(name) for name in selected]
+            analysis = files[path] = FileAnalysis(path, selected, rate, len(chunks), args.window)
+            for start, stop in chunks:
+                futures[pool.submit(analyse_chunk, path, start, stop, columns, rate,
+                                    args.segment, args.window, args.lowpass, origin)] = (path, 'chunk')
+            if args.alarms == 'none':
+                analysis.events = []
+            else:
+                futures[pool.submit(replay_alarms, path, chunks, channels, args.alarms)] = \
+                    (path, 'alarms')
+
+        for future in as_completed(futures):
+            path, kind = futures.pop(future)
+            if path not in files:
+                continue  # An earlier part of this file failed
+            analysis = files[path]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Warning: analysis of {path} failed: {e}")
+                files.pop(path)
+                continue
+            if kind == 'chunk':
+                analysis.add(result)
+            else:
+                analysis.events = result
+            if analysis.done():
+                summary = analysis.write(args.out)
+                print(f"{path}: {summary['rows']} rows, {summary['duration']:.1f} s, "
+                      f"{summary['alarms']['raised']} alarms")
+                files.pop(path)
+                written += 1
+    print(f"Analysed {written} of {len(paths)} files in {time.monotonic() - started:.1f} s, results in {args.out}")
+    return 0
+
+def main(argv=None):
+    return run(build_parser().parse_args(argv))
+
+if __name__ == '__main__':
+    sys.exit(main())
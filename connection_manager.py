@@ -0,0 +1,72 @@
+import threading
+import serial.tools.list_ports
+
+DISCONNECTED = 'disconnected'
+CONNECTING = 'connecting'
+CONNECTED = 'connected'
+RECONNECTING = 'reconnecting'
+
+def list_ports():
+    return sorted(port.device for port in serial.tools.list_ports.comports())
+
+class Backoff:
+    def __init__(self, initial=0.5, maximum=10.0, factor=2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.reset()
+
+    def reset(self):
+        self.delay = self.initial
+
+    def next(self):
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.maximum)
+        return delay
+
+class PortWatcher:
+    # Polls the serial device list and reports plugged/unplugged ports
+    def __init__(self, callback, interval=1.0):
+        self.callback = callback
+        self.interval = interval
+        self.ports = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Every thread gets a stop event of its own, so a thread that is
+        # still finishing a poll after stop() never sees a later start()
+        if self._thread is None:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.interval)
+
+    def refresh(self):
+        self._wake.set()
+
+    def _run(self, stop):
+        first = True
+        while not stop.is_set():
+            try:
+                ports = set(list_ports())
+            except Exception as e:
+                print(f"Error listing ports: {e}")
+                ports = self.ports
+            added = ports - self.ports
+            removed = self.ports - ports
+            self.ports = ports
+            if stop.is_set():
+                break
+            if first or added or removed:
+                self.callback(sorted(ports), added, removed)
+            first = False
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,350 @@
+import math
+import os
+import sys
+import threading
+import time
+
+class PID:
+    # PID with derivative on measurement (no setpoint kick), a first-order
+    # low-pass on the derivative, feed-forward and clamping anti-windup
+    def __init__(self, kp=1.0, ki=0.0, kd=0.0, output_limit=100.0, derivative_tau=0.01):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.derivative_tau = derivative_tau
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.previous = None
+        self.output = 0.0
+
+    def update(self, setpoint, measurement, dt, feedforward=0.0):
+        error = setpoint - measurement
+        proportional = self.kp * error
+
+        if self.previous is not None and dt > 0:
+            rate = -(measurement - self.previous) / dt
+            alpha = dt / (self.derivative_tau + dt)
+            self.derivative += alpha * (rate - self.derivative)
+        self.previous = measurement
+        derivative = self.kd * self.derivative
+
+        limit = self.output_limit
+        integral = self.integral + self.ki * error * dt
+        output = proportional + integral + derivative + feedforward
+        # Stop integrating while saturated in the direction of the error
+        if not ((output > limit and error > 0) or (output < -limit and error < 0)):
+            self.integral = max(-limit, min(limit, integral))
+
+        output = proportional + self.integral + derivative + feedforward
+        self.output = max(-limit, min(limit, output))
+        return self.output
+
+class MotorLoop:
+    def __init__(self, pid, kv=0.0):
+        self.pid = pid
+        self.kv = kv              # Velocity feed-forward gain
+        self.setpoint = None      # None = not under closed-loop control
+        self.velocity = 0.0       # Setpoint velocity for feed-forward
+        self.feedforward = 0.0    # Constant feed-forward, e.g. gravity load
+        self.position = None      # Encoder reading continued across wraps
+        self.last_sent = None
+
+    def reset(self):
+        self.pid.reset()
+        self.position = None
+
+def _raise_priority():
+    # Best effort: time-critical thread and 1 ms timer resolution on Windows,
+    # a negative per-thread nice value on Linux (needs privileges)
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 15)  # THREAD_PRIORITY_TIME_CRITICAL
+            ctypes.windll.winmm.timeBeginPeriod(1)
+        elif hasattr(os, 'setpriority'):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), -10)
+    except (OSError, AttributeError) as e:
+        print(f"Note: could not raise control thread priority: {e}")
+
+def _restore_timer():
+    if sys.platform == 'win32':
+        try:
+            import ctypes
+            ctypes.windll.winmm.timeEndPeriod(1)
+        except (OSError, AttributeError):
+            pass
+
+class ControlEngine:
+    # Fixed-rate closed-loop position control for every motor on its own
+    # thread, independent of any GUI event loop. Feedback is the latest encoder
+    # row in the TelemetryStore, outputs go out through send(command, motor,
+    # value) as 'effort' commands in % of each motor's torque limit. The
+    # thread only runs while a motor has a setpoint or a trajectory streams:
+    # it starts with the first command and exits once nothing is engaged.
+    # feedback_time(channel) gives the monotonic time of a channel's latest
+    # reading (None when it has no source), so one quiet device cannot hide
+    # behind another that is still streaming; by default the store's newest
+    # row time is used for every channel. Encoder angles wrap every `wrap`
+    # degrees and the error takes the short way round (wrap=None for linear
+    # feedback).
+    def __init__(self, store, send, rate=500.0, motors=3, kp=2.0, ki=0.5, kd=0.05, kv=0.0,
+                 feedback_timeout=0.1, deadband=0.05, spin=0.0, feedback_time=None, wrap=360.0):
+        self.store = store
+        self.send = send
+        self.set_rate(rate)
+        self.feedback = [f"enc{i+1}" for i in range(motors)]
+        self.feedback_idx = [store.index[channel] for channel in self.feedback]
+        self.feedback_time = feedback_time
+        self.wrap = wrap
+        self.loops = [MotorLoop(PID(kp, ki, kd), kv) for _ in range(motors)]
+        self.feedback_timeout = feedback_timeout
+        self.deadband = deadband  # Output changes below this are not resent
+        self.spin = spin          # Busy-wait this long before each deadline
+        self._lock = threading.Lock()
+        self._trajectory = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._switch_interval = None
+        self.reset_stats()
+
+    def set_rate(self, rate):
+        self.rate = float(rate)
+        self.period = 1.0 / self.rate
+
+    def reset_stats(self):
+        self.cycles = 0
+        self.overruns = 0
+        self.missed_cycles = 0
+        self.stale_cycles = 0
+        self.jitter_max = 0.0
+        self._jitter_sum = 0.0
+        self._jitter_sq = 0.0
+        self.compute_max = 0.0
+
+    def set_setpoint(self, motor, position, velocity=0.0):
+        with self._lock:
+            self._trajectory = None
+            loop = self.loops[motor]
+            if loop.setpoint is None:
+                loop.reset()
+            loop.setpoint = float(position)
+            loop.velocity = float(velocity)
+            self._ensure_running()
+
+    def follow(self, trajectory, motors=None):
+        # Stream a precomputed trajectory.Trajectory, one row per control
+        # cycle: position rows become setpoints (with velocity feed-forward),
+        # velocity rows are sent to the motors as they come due
+        motors = list(range(trajectory.values.shape[1])) if motors is None else list(motors)
+        with self._lock:
+            for m in motors:
+                loop = self.loops[m]
+                if trajectory.kind == 'velocity' or loop.setpoint is None:
+                    loop.reset()
+                if trajectory.kind == 'velocity':
+                    loop.setpoint = None  # The motor runs its own velocity loop
+            self._trajectory = trajectory
+            self._trajectory_axes = list(enumerate(motors))
+            self._trajectory_start = time.perf_counter()
+            self._trajectory_index = -1
+            self._ensure_running()
+
+    def cancel(self):
+        # Stop streaming; setpoints keep their last streamed values
+        with self._lock:
+            self._trajectory = None
+
+    def following(self):
+        return self._trajectory is not None
+
+    def set_output_limit(self, motor, percent):
+        with self._lock:
+            self.loops[motor].pid.output_limit = max(0.0, min(100.0, float(percent)))
+
+    def set_gains(self, motor, kp=None, ki=None, kd=None, kv=None):
+        with self._lock:
+            loop = self.loops[motor]
+            loop.pid.kp = loop.pid.kp if kp is None else kp
+            loop.pid.ki = loop.pid.ki if ki is None else ki
+            loop.pid.kd = loop.pid.kd if kd is None else kd
+            loop.kv = loop.kv if kv is None else kv
+
+    def release(self, motor=None):
+        # Leave closed-loop control and command zero effort; a trajectory
+        # keeps streaming to the motors that were not released
+        motors = range(len(self.loops)) if motor is None else [motor]
+        with self._lock:
+            if self._trajectory is not None:
+                self._trajectory_axes = [(axis, m) for axis, m in self._trajectory_axes
+                                         if m not in motors]
+                if not self._trajectory_axes:
+                    self._trajectory = None
+            for m in motors:
+                loop = self.loops[m]
+                loop.setpoint = None
+                loop.reset()
+                loop.last_sent = None
+                self.send('effort', m + 1, 0.0)
+
+    def active(self):
+        return any(loop.setpoint is not None for loop in self.loops)
+
+    def engaged(self):
+        return self.active() or self._trajectory is not None
+
+    def running(self):
+        return self._thread is not None
+
+    def _ensure_running(self):
+        # Called with _lock held, like the thread's decision to exit
+        if self._thread is None:
+            # Other Python threads hold the GIL for up to the switch interval
+            # (5 ms by default), longer than a whole control period
+            if sys.getswitchinterval() > self.period / 5:
+                self._switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(self.period / 5)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="control")
+            self._thread.start()
+
+    def _finish(self):
+        # Called with _lock held by the exiting thread
+        self._thread = None
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        self.release()
+
+    def _run(self):
+        _raise_priority()
+        try:
+            deadline = time.perf_counter()
+            previous = deadline
+            while not self._stop.is_set():
+                with self._lock:
+                    if not self.engaged():
+                        break
+                # Sleep to the absolute deadline so timing errors never accumulate
+                remaining = deadline - time.perf_counter()
+                if remaining > self.spin:
+                    time.sleep(remaining - self.spin)
+                while time.perf_counter() < deadline:
+                    pass
+
+                start = time.perf_counter()
+                lateness = start - deadline
+                self._record_jitter(lateness)
+                self.step(start - previous)
+                previous = start
+
+                finished = time.perf_counter()
+                self.compute_max = max(self.compute_max, finished - start)
+                deadline += self.period
+                if finished > deadline:
+                    # Overrun: skip the cycles we can no longer make
+                    missed = math.floor((finished - deadline) / self.period) + 1
+                    self.overruns += 1
+                    self.missed_cycles += missed
+                    deadline += missed * self.period
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._finish()
+            _restore_timer()
+
+    def _record_jitter(self, lateness):
+        self.cycles += 1
+        self.jitter_max = max(self.jitter_max, abs(lateness))
+        self._jitter_sum += lateness
+        self._jitter_sq += lateness * lateness
+
+    def _advance(self):
+        trajectory = self._trajectory
+        index = min(int((time.perf_counter() - self._trajectory_start) * trajectory.rate),
+                    len(trajectory) - 1)
+        if index == self._trajectory_index:
+            return
+        self._trajectory_index = index
+        values, rates = trajectory.values[index], trajectory.rates[index]
+        for axis, m in self._trajectory_axes:
+            if trajectory.kind == 'position':
+                self.loops[m].setpoint = values[axis]
+                self.loops[m].velocity = rates[axis]
+            else:
+                self.send('velocity', m + 1, values[axis])
+        if index == len(trajectory) - 1:
+            self._trajectory = None
+
+    def _feedback_times(self):
+        if self.feedback_time is None:
+            t = self.store.latest()[0]
+            return [t] * len(self.loops)
+        return [self.feedback_time(channel) for channel in self.feedback]
+
+    def step(self, dt):
+        _, row = self.store.latest()
+        times = self._feedback_times()
+        now = time.monotonic()
+        with self._lock:
+            if self._trajectory is not None:
+                self._advance()
+            stale = False
+            for m, loop in enumerate(self.loops):
+                if loop.setpoint is None:
+                    continue
+                t = times[m]
+                measurement = row[self.feedback_idx[m]] if row is not None else math.nan
+                if t is None or now - t > self.feedback_timeout or measurement != measurement:
+                    # Without fresh feedback, hold the motor at zero effort
+                    stale = True
+                    if loop.last_sent != 0.0:
+                        self.send('effort', m + 1, 0.0)
+                        loop.last_sent = 0.0
+                    loop.reset()
+                    continue
+
+                setpoint = loop.setpoint
+                if self.wrap is not None:
+                    # Follow the encoder across its wrap and aim for the
+                    # nearest turn of the setpoint
+                    half = self.wrap / 2
+                    if loop.position is None:
+                        loop.position = measurement
+                    else:
+                        loop.position += (measurement - loop.position + half) % self.wrap - half
+                    measurement = loop.position
+                    setpoint = measurement + (loop.setpoint - measurement + half) % self.wrap - half
+                feedforward = loop.feedforward + loop.kv * loop.velocity
+                output = loop.pid.update(setpoint, measurement, dt, feedforward)
+                if loop.last_sent is None or abs(output - loop.last_sent) >= self.deadband:
+                    self.send('effort', m + 1, output)
+                    loop.last_sent = output
+            if stale:
+                self.stale_cycles += 1
+
+    def stats(self):
+        cycles = max(self.cycles, 1)
+        mean = self._jitter_sum / cycles
+        std = math.sqrt(max(0.0, self._jitter_sq / cycles - mean * mean))
+        return {
+            'rate': self.rate,
+            'cycles': self.cycles,
+            'overruns': self.overruns,
+            'missed_cycles': self.missed_cycles,
+            'stale_cycles': self.stale_cycles,
+            'jitter_mean_us': mean * 1e6,
+            'jitter_std_us': std * 1e6,
+            'jitter_max_us': self.jitter_max * 1e6,
+            'compute_max_us': self.compute_max * 1e6
+        }
@@ -0,0 +1,184 @@
+import numpy as np
+
+class _Buffer:
+    # Append-only float array (rows of `shape`) with amortized doubling growth
+    def __init__(self, shape=(), capacity=1024):
+        self.data = np.empty((capacity,) + shape)
+        self.size = 0
+
+    def extend(self, values):
+        n = len(values)
+        if self.size + n > len(self.data):
+            new_capacity = max(2 * len(self.data), self.size + n)
+            grown = np.empty((new_capacity,) + self.data.shape[1:])
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:self.size + n] = values
+        self.size += n
+
+    def drop_front(self, n):
+        self.data[:self.size - n] = self.data[n:self.size]
+        self.size -= n
+
+    def view(self):
+        return self.data[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+class _Level:
+    def __init__(self, shape=()):
+        self.x_first = _Buffer()
+        self.x_last = _Buffer()
+        self.lo = _Buffer(shape)
+        self.hi = _Buffer(shape)
+
+    def __len__(self):
+        return self.lo.size
+
+    def arrays(self):
+        return (self.x_first.view(), self.x_last.view(),
+                self.lo.view(), self.hi.view())
+
+    def clear(self):
+        for buf in (self.x_first, self.x_last, self.lo, self.hi):
+            buf.clear()
+
+class MinMaxPyramid:
+    # Multi-resolution min/max envelope of a time series. Level k holds one
+    # (min, max) pair per factor**k raw samples and is extended incrementally
+    # as samples arrive, so any time range can be drawn with a bounded number
+    # of points without hiding spikes. With `columns`, y is a (samples,
+    # columns) block of series sharing one time axis. With `max_raw`, only
+    # the newest raw samples are kept (trimmed to half once over the limit,
+    # never before they are folded into level 1) and older ranges are drawn
+    # from level 1 and up.
+    def __init__(self, factor=4, max_levels=12, columns=None, max_raw=None):
+        self.factor = factor
+        self.max_levels = max_levels
+        self.shape = () if columns is None else (columns,)
+        self.max_raw = max_raw
+        self._x = _Buffer()
+        self._y = _Buffer(self.shape)
+        self._dropped = 0  # Raw samples trimmed from the front
+        self._levels = []
+
+    def __len__(self):
+        return self._dropped + self._x.size
+
+    def append(self, x, y):
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.asarray(y, dtype=float).reshape((len(x),) + self.shape)
+        if len(x) == 0:
+            return
+        self._x.extend(x)
+        self._y.extend(y)
+        self._propagate()
+        if self.max_raw is not None and self._x.size > self.max_raw:
+            self._trim()
+
+    def clear(self):
+        self._x.clear()
+        self._y.clear()
+        self._dropped = 0
+        for level in self._levels:
+            level.clear()
+
+    def first_x(self):
+        if self._dropped:
+            return self._levels[0].x_first.data[0]
+        return self._x.data[0] if self._x.size else None
+
+    def last_x(self):
+        return self._x.data[self._x.size - 1] if self._x.size else None
+
+    def _source(self, k):
+        # Level 0 is the raw data, level k >= 1 is self._levels[k - 1]; the
+        # second value is the index of the first entry still held
+        if k == 0:
+            x, y = self._x.view(), self._y.view()
+            return (x, x, y, y), self._dropped
+        return self._levels[k - 1].arrays(), 0
+
+    def _propagate(self):
+        f = self.factor
+        for k in range(self.max_levels):
+            (x_first, x_last, lo, hi), offset = self._source(k)
+            complete = (offset + len(lo)) // f
+            if k >= len(self._levels):
+                if complete == 0:
+                    break
+                self._levels.append(_Level(self.shape))
+            level = self._levels[k]
+            start = len(level)
+            if complete <= start:
+                break
+
+            seg = slice(start * f - offset, complete * f - offset)
+            blocks = (-1, f) + self.shape
+            # fmin/fmax ignore NaN gap markers unless a whole block is a gap
+            level.lo.extend(np.fmin.reduce(lo[seg].reshape(blocks), axis=1))
+            level.hi.extend(np.fmax.reduce(hi[seg].reshape(blocks), axis=1))
+            level.x_first.extend(x_first[seg][::f])
+            level.x_last.extend(x_last[seg][f - 1::f])
+
+    def _trim(self):
+        # Drop the oldest raw samples that level 1 already covers
+        folded = len(self._levels[0]) * self.factor - self._dropped if self._levels else 0
+        n = min(folded, self._x.size - self.max_raw // 2)
+        if n > 0:
+            self._x.drop_front(n)
+            self._y.drop_front(n)
+            self._dropped += n
+
+    def _blocks(self, k, x0, x1):
+        # Complete blocks of level k inside [x0, x1], followed by the finer
+        # entries that have not yet been folded into level k
+        pieces = []
+        for j in range(k, -1, -1):
+            (x_first, x_last, lo, hi), offset = self._source(j)
+            start = 0
+            if j < k:
+                start = len(self._levels[j]) * self.factor - offset
+            i0 = start + np.searchsorted(x_last[start:], x0, side='left')
+            i1 = start + np.searchsorted(x_first[start:], x1, side='right')
+            if i1 > i0:
+                pieces.append((x_first[i0:i1], x_last[i0:i1], lo[i0:i1], hi[i0:i1]))
+        if not pieces:
+            empty = np.empty(0)
+            return empty, empty, np.empty((0,) + self.shape), np.empty((0,) + self.shape)
+        return tuple(np.concatenate(parts) for parts in zip(*pieces))
+
+    def level_for(self, x0, x1, max_points):
+        # Count the range on the finest level that still holds all of it
+        k = 1 if self._dropped and x0 < self._x.data[0] else 0
+        (x_first, x_last, _, _), _ = self._source(k)
+        n = (np.searchsorted(x_first, x1, side='right')
+             - np.searchsorted(x_last, x0, side='left')) * self.factor ** k
+        # Each block is drawn as two points
+        while k < len(self._levels) and n > max(1, max_points // 2) * self.factor ** k:
+            k += 1
+        return k
+
+    def query(self, x0=None, x1=None, max_points=2000):
+        if len(self) == 0:
+            return np.empty(0), np.empty((0,) + self.shape)
+        x0 = self.first_x() if x0 is None else x0
+        x1 = self.last_x() if x1 is None else x1
+
+        k = self.level_for(x0, x1, max_points)
+        if k == 0:
+            x = self._x.view()
+            i0 = np.searchsorted(x, x0, side='left')
+            i1 = np.searchsorted(x, x1, side='right')
+            return x[i0:i1].copy(), self._y.view()[i0:i1].copy()
+
+        x_first, x_last, lo, hi = self._blocks(k, x0, x1)
+        # Interleave min and max so the drawn line covers the full envelope
+        xs = np.empty(2 * len(lo))
+        ys = np.empty((2 * len(lo),) + self.shape)
+        xs[0::2] = x_first
+        xs[1::2] = x_last
+        ys[0::2] = lo
+        ys[1::2] = hi
+        return xs, ys
@@ -0,0 +1,101 @@
+import numpy as np
+
+# Encoder angles arrive modulo 360 degrees. EncoderStage unwraps them into a
+# continuous position, counts whole revolutions and differentiates the
+# position with a causal Savitzky-Golay filter: a quadratic least-squares fit
+# over the last `window` samples, evaluated at the newest one. The fit uses
+# the samples' own timestamps, so jittery arrival times do not show up as
+# speed noise, and all motors and samples of a block are solved at once.
+# Steps of more than half a turn between two samples cannot be told apart
+# from a step the other way, so the encoders must be read faster than
+# 2 x (rpm / 60) frames per second.
+
+def unwrap(angles, last, period=360.0):
+    # Continuous angles for a (samples, motors) block, continuing from last
+    # (the previous unwrapped value per motor, NaN before the first reading).
+    # Returns (unwrapped, new last); NaN readings stay NaN.
+    valid = np.isfinite(angles)
+    # Hold the last reading across gaps so the steps stay continuous
+    index = np.maximum.accumulate(np.where(valid, np.arange(len(angles))[:, None], -1), axis=0)
+    first = angles[valid.argmax(axis=0), np.arange(angles.shape[1])]
+    start = np.where(np.isfinite(last), last, first)
+    filled = np.where(index >= 0, np.take_along_axis(angles, np.maximum(index, 0), axis=0), start)
+    steps = np.diff(np.vstack([start, filled]), axis=0)
+    steps = np.where(np.isfinite(steps), (steps + period / 2) % period - period / 2, 0.0)
+    unwrapped = start + np.cumsum(steps, axis=0)
+    return np.where(valid, unwrapped, np.nan), start + steps.sum(axis=0)
+
+def savgol_derivatives(times, values, window=9):
+    # First and second derivative at every sample from a quadratic fit over
+    # it and the window - 1 samples before it. times is (n + window - 1,),
+    # values (n + window - 1, motors); returns two (n, motors) arrays.
+    # Windows with fewer than 3 finite samples give NaN.
+    from numpy.lib.stride_tricks import sliding_window_view
+    t = sliding_window_view(times, window)                      # (n, window)
+    y = sliding_window_view(values, window, axis=0)             # (n, motors, window)
+    tau = t - t[:, -1:]
+    scale = np.maximum(tau[:, :1] / -(window - 1), 1e-6)        # Mean step, conditions the fit
+    s = (tau / scale)[:, None, :]                               # (n, 1, window)
+    w = np.isfinite(y)
+    y = np.where(w, y, 0.0)
+    # Normal equations of y = b0 + b1 s + b2 s^2 per sample and motor,
+    # solved in closed form (Cramer's rule) for all of them at once
+    powers = [w, w * s, w * s ** 2, w * s ** 3, w * s ** 4]
+    m0, m1, m2, m3, m4 = [p.sum(axis=-1) for p in powers]
+    r0, r1, r2 = [(p * y).sum(axis=-1) for p in powers[:3]]
+    c00 = m2 * m4 - m3 * m3
+    c01 = m1 * m4 - m2 * m3
+    c02 = m1 * m3 - m2 * m2
+    det = m0 * c00 - m1 * c01 + m2 * c02
+    enough = (m0 >= 3) & (np.abs(det) > 1e-9 * np.maximum(m0, 1) ** 3)
+    det = np.where(enough, det, 1.0)
+    b1 = (-r0 * c01 + r1 * (m0 * m4 - m2 * m2) - r2 * (m0 * m3 - m1 * m2)) / det
+    b2 = (r0 * c02 - r1 * (m0 * m3 - m2 * m1) + r2 * (m0 * m2 - m1 * m1)) / det
+    scale = scale[:, :1]
+    velocity = np.where(enough, b1 / scale, np.nan)
+    acceleration = np.where(enough, 2 * b2 / scale ** 2, np.nan)
+    return velocity, acceleration
+
+class EncoderStage:
+    # Acquisition stage adding, per encoder, <enc>_unwrapped (degrees),
+    # <enc>_revs (whole turns since the first reading), <enc>_rpm and
+    # <enc>_accel (degrees/s^2)
+    def __init__(self, inputs=('enc1', 'enc2', 'enc3'), window=9, period=360.0):
+        if window < 3:
+            raise ValueError("The velocity fit needs a window of at least 3 samples")
+        self.inputs = list(inputs)
+        self.outputs = [f"{name}_{suffix}" for suffix in ['unwrapped', 'revs', 'rpm', 'accel']
+                        for name in self.inputs]
+        self.window = window
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        n = len(self.inputs)
+        self.last = np.full(n, np.nan)
+        self.origin = np.full(n, np.nan)  # First unwrapped reading, revolution zero
+        self.history_times = np.full(self.window - 1, np.nan)
+        self.history = np.full((self.window - 1, n), np.nan)
+
+    def bind(self, index):
+        self.input_idx = [index[name] for name in self.inputs]
+        self.output_idx = [index[name] for name in self.outputs]
+
+    def process(self, times, rows):
+        position, self.last = unwrap(rows[:, self.input_idx], self.last, self.period)
+        # Revolution zero is each encoder's first finite reading
+        finite = np.isfinite(position)
+        first = position[finite.argmax(axis=0), np.arange(position.shape[1])]
+        self.origin = np.where(np.isfinite(self.origin), self.origin, first)
+        revs = np.trunc((position - self.origin) / self.period) + 0.0  # No -0.0
+
+        all_times = np.concatenate([self.history_times, times])
+        all_position = np.vstack([self.history, position])
+        # Samples from before the first reading have no time yet
+        all_position[~np.isfinite(all_times)] = np.nan
+        all_times = np.where(np.isfinite(all_times), all_times, times[0])
+        velocity, acceleration = savgol_derivatives(all_times, all_position, self.window)
+        self.history_times = all_times[-(self.window - 1):]
+        self.history = all_position[-(self.window - 1):]
+
+        rows[:, self.output_idx] = np.hstack([position, revs, velocity / 6.0, acceleration])
@@ -3,23 +3,25 @@ from scipy.fft import fft
 from scipy.signal import windows, butter, filtfilt
 
 class FFTProcessor:
-    def __init__(self, sample_rate, buffer_size):
+    def __init__(self, sample_rate, buffer_size, cutoff=20):
         self.sample_rate = sample_rate
         self.buffer_size = buffer_size
         self.window = windows.hann(buffer_size)
         
         # Setup butterworth filter
         self.nyquist = sample_rate / 2
-        self.cutoff = 20  # Hz
+        self.cutoff = min(cutoff, 0.9 * self.nyquist)  # Hz, must stay below Nyquist
         self.b, self.a = butter(4, self.cutoff/self.nyquist)
         
     def process(self, data):
+        # data may also hold several buffers along its first axes, e.g.
+        # (segments, channels, buffer_size); each is transformed on its own
         # Apply window function
         windowed_data = np.array(data) * self.window
         
         # Perform FFT
         fft_result = fft(windowed_data)
-        frequencies = np.fft.fftfreq(len(data), 1/self.sample_rate)
+        frequencies = np.fft.fftfreq(np.shape(data)[-1], 1/self.sample_rate)
         
         # Calculate magnitude spectrum
         magnitude = 2.0/self.buffer_size * np.abs(fft_result)
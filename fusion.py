@@ -0,0 +1,217 @@
+import math
+import numpy as np
+
+# Orientation estimation from raw gyro (deg/s) and accelerometer (any unit)
+# samples. Every filter takes a whole block per call: unit conversion, time
+# steps, accelerometer normalization and the Euler conversion are vectorized,
+# only the unavoidable per-sample recursion runs as a tight scalar loop.
+
+def quaternion_to_euler(q):
+    # (N, 4) quaternions [w, x, y, z] -> (N, 3) roll, pitch, yaw in degrees
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    roll = np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return np.degrees(np.column_stack([roll, pitch, yaw]))
+
+def euler_to_quaternion(roll, pitch, yaw):
+    # Angles in radians (arrays), ZYX order -> (N, 4) quaternions
+    cr, sr = np.cos(roll / 2), np.sin(roll / 2)
+    cp, sp = np.cos(pitch / 2), np.sin(pitch / 2)
+    cy, sy = np.cos(yaw / 2), np.sin(yaw / 2)
+    return np.column_stack([cr * cp * cy + sr * sp * sy,
+                            sr * cp * cy - cr * sp * sy,
+                            cr * sp * cy + sr * cp * sy,
+                            cr * cp * sy - sr * sp * cy])
+
+def accel_angles(accel):
+    # Roll and pitch (radians) of the gravity vector seen by the accelerometer
+    ax, ay, az = accel[:, 0], accel[:, 1], accel[:, 2]
+    return np.arctan2(ay, az), np.arctan2(-ax, np.hypot(ay, az))
+
+class OrientationFilter:
+    def __init__(self, max_dt=0.1):
+        self.max_dt = max_dt  # Longer steps (e.g. after a gap) are clamped
+        self.reset()
+
+    def reset(self):
+        self.q = np.array([1.0, 0.0, 0.0, 0.0])
+        self.last_time = None
+
+    def _steps(self, times):
+        times = np.asarray(times, dtype=float)
+        previous = times[0] if self.last_time is None else self.last_time
+        dt = np.diff(times, prepend=previous)
+        self.last_time = times[-1]
+        return np.clip(dt, 0.0, self.max_dt)
+
+    def update(self, times, gyro, accel):
+        # times (N,), gyro (N, 3) deg/s, accel (N, 3) -> (N, 4) quaternions
+        raise NotImplementedError
+
+class ComplementaryFilter(OrientationFilter):
+    # Blends integrated gyro rates with accelerometer angles. Per block the
+    # recursion angle[n] = a * angle[n-1] + x[n] is a first-order IIR, so it
+    # runs through scipy.signal.lfilter. Yaw is gyro-only and will drift.
+    def __init__(self, time_constant=0.5, max_dt=0.1):
+        self.time_constant = time_constant
+        super().__init__(max_dt)
+
+    def reset(self):
+        super().reset()
+        self.angles = None
+
+    def update(self, times, gyro, accel):
+        from scipy.signal import lfilter
+        dt = self._steps(times)
+        rates = np.radians(np.asarray(gyro, dtype=float))
+        acc_roll, acc_pitch = accel_angles(np.asarray(accel, dtype=float))
+
+        if self.angles is None:
+            self.angles = np.array([acc_roll[0], acc_pitch[0], 0.0])
+        step = dt.mean()
+        a = self.time_constant / (self.time_constant + step) if step > 0 else 1.0
+
+        roll, _ = lfilter([1.0], [1.0, -a], a * rates[:, 0] * dt + (1 - a) * acc_roll,
+                          zi=[a * self.angles[0]])
+        pitch, _ = lfilter([1.0], [1.0, -a], a * rates[:, 1] * dt + (1 - a) * acc_pitch,
+                           zi=[a * self.angles[1]])
+        yaw = self.angles[2] + np.cumsum(rates[:, 2] * dt)
+        yaw = (yaw + np.pi) % (2 * np.pi) - np.pi
+
+        self.angles = np.array([roll[-1], pitch[-1], yaw[-1]])
+        q = euler_to_quaternion(roll, pitch, yaw)
+        self.q = q[-1]
+        return q
+
+class MadgwickFilter(OrientationFilter):
+    # Gradient-descent fusion (Madgwick 2010, IMU variant without magnetometer)
+    def __init__(self, beta=0.1, max_dt=0.1):
+        self.beta = beta
+        super().__init__(max_dt)
+
+    def update(self, times, gyro, accel):
+        dt = self._steps(times)
+        g = np.radians(np.asarray(gyro, dtype=float))
+        a = np.asarray(accel, dtype=float)
+        norm = np.linalg.norm(a, axis=1)
+        has_accel = norm > 0
+        a[has_accel] /= norm[has_accel, None]
+
+        out = np.empty((len(dt), 4))
+        beta = self.beta
+        q0, q1, q2, q3 = self.q.tolist()
+        for n, (step, gx, gy, gz, ax, ay, az, use_accel) in enumerate(
+                zip(dt.tolist(), *g.T.tolist(), *a.T.tolist(), has_accel.tolist())):
+            qd0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+            qd1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+            qd2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+            qd3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+            if use_accel:
+                s0 = 4 * q0 * q2 * q2 + 2 * q2 * ax + 4 * q0 * q1 * q1 - 2 * q1 * ay
+                s1 = (4 * q1 * q3 * q3 - 2 * q3 * ax + 4 * q0 * q0 * q1 - 2 * q0 * ay
+                      - 4 * q1 + 8 * q1 * q1 * q1 + 8 * q1 * q2 * q2 + 4 * q1 * az)
+                s2 = (4 * q0 * q0 * q2 + 2 * q0 * ax + 4 * q2 * q3 * q3 - 2 * q3 * ay
+                      - 4 * q2 + 8 * q2 * q1 * q1 + 8 * q2 * q2 * q2 + 4 * q2 * az)
+                s3 = 4 * q1 * q1 * q3 - 2 * q1 * ax + 4 * q2 * q2 * q3 - 2 * q2 * ay
+                s_norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+                if s_norm > 0:
+                    qd0 -= beta * s0 / s_norm
+                    qd1 -= beta * s1 / s_norm
+                    qd2 -= beta * s2 / s_norm
+                    qd3 -= beta * s3 / s_norm
+
+            q0 += qd0 * step
+            q1 += qd1 * step
+            q2 += qd2 * step
+            q3 += qd3 * step
+            q_norm = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0, q1, q2, q3 = q0 / q_norm, q1 / q_norm, q2 / q_norm, q3 / q_norm
+            out[n] = (q0, q1, q2, q3)
+
+        self.q = out[-1].copy()
+        return out
+
+class MahonyFilter(OrientationFilter):
+    # Nonlinear complementary filter on SO(3) with PI feedback (Mahony 2008)
+    def __init__(self, kp=1.0, ki=0.0, max_dt=0.1):
+        self.kp = kp
+        self.ki = ki
+        super().__init__(max_dt)
+
+    def reset(self):
+        super().reset()
+        self.integral = [0.0, 0.0, 0.0]
+
+    def update(self, times, gyro, accel):
+        dt = self._steps(times)
+        g = np.radians(np.asarray(gyro, dtype=float))
+        a = np.asarray(accel, dtype=float)
+        norm = np.linalg.norm(a, axis=1)
+        has_accel = norm > 0
+        a[has_accel] /= norm[has_accel, None]
+
+        out = np.empty((len(dt), 4))
+        kp, ki = self.kp, self.ki
+        ix, iy, iz = self.integral
+        q0, q1, q2, q3 = self.q.tolist()
+        for n, (step, gx, gy, gz, ax, ay, az, use_accel) in enumerate(
+                zip(dt.tolist(), *g.T.tolist(), *a.T.tolist(), has_accel.tolist())):
+            if use_accel:
+                # Error between measured and estimated direction of gravity
+                vx = q1 * q3 - q0 * q2
+                vy = q0 * q1 + q2 * q3
+                vz = q0 * q0 - 0.5 + q3 * q3
+                ex = ay * vz - az * vy
+                ey = az * vx - ax * vz
+                ez = ax * vy - ay * vx
+                if ki > 0:
+                    ix += 2 * ki * ex * step
+                    iy += 2 * ki * ey * step
+                    iz += 2 * ki * ez * step
+                    gx, gy, gz = gx + ix, gy + iy, gz + iz
+                gx += 2 * kp * ex
+                gy += 2 * kp * ey
+                gz += 2 * kp * ez
+
+            gx, gy, gz = 0.5 * gx * step, 0.5 * gy * step, 0.5 * gz * step
+            qa, qb, qc = q0, q1, q2
+            q0 += -qb * gx - qc * gy - q3 * gz
+            q1 += qa * gx + qc * gz - q3 * gy
+            q2 += qa * gy - qb * gz + q3 * gx
+            q3 += qa * gz + qb * gy - qc * gx
+            q_norm = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+            q0, q1, q2, q3 = q0 / q_norm, q1 / q_norm, q2 / q_norm, q3 / q_norm
+            out[n] = (q0, q1, q2, q3)
+
+        self.integral = [ix, iy, iz]
+        self.q = out[-1].copy()
+        return out
+
+FILTERS = {
+    'complementary': ComplementaryFilter,
+    'madgwick': MadgwickFilter,
+    'mahony': MahonyFilter
+}
+
+class FusionStage:
+    # Acquisition stage: turns raw gyro/accel channels into fused orientation
+    # channels for every block a device publishes
+    inputs = ['gx', 'gy', 'gz', 'ax', 'ay', 'az']
+    outputs = ['fused_roll', 'fused_pitch', 'fused_yaw']
+
+    def __init__(self, orientation_filter=None):
+        self.filter = MadgwickFilter() if orientation_filter is None else orientation_filter
+
+    def bind(self, index):
+        self.input_idx = [index[name] for name in self.inputs]
+        self.output_idx = [index[name] for name in self.outputs]
+
+    def process(self, times, rows):
+        raw = rows[:, self.input_idx]
+        valid = np.isfinite(raw).all(axis=1)
+        if not valid.any():
+            return
+        q = self.filter.update(times[valid], raw[valid, :3], raw[valid, 3:])
+        rows[np.ix_(valid, self.output_idx)] = quaternion_to_euler(q)
@@ -0,0 +1,187 @@
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Acquisition, orientation filtering and continuous logging without a GUI.
+# Nothing here imports Qt or pyqtgraph, so it starts quickly and stays small
+# enough for a lab PC or single-board computer next to the rig.
+
+SIMULATION_INTERVAL = 0.05  # Same frame rate as the GUI's simulator
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Record motor and gyro telemetry without a display")
+    parser.add_argument('--config', metavar='FILE',
+                        help="JSON file with any of these options; arguments override it")
+    parser.add_argument('--port', help="serial port of the main device, e.g. COM3")
+    parser.add_argument('--baud', type=int, default=115200, help="baud rate of --port")
+    parser.add_argument('--device', action='append', default=[],
+                        help="extra serial device as name=PORT[@baud][:field,...]")
+    parser.add_argument('--simulate', action='store_true',
+                        help="record synthetic frames while no device is connected")
+    parser.add_argument('--fusion', choices=['madgwick', 'mahony', 'complementary', 'none'],
+                        default='madgwick', help="orientation filter for raw gyro/accel data")
+    parser.add_argument('--log', default=None, metavar='FILE',
+                        help="CSV log path (default session_<timestamp>.csv, 'none' to disable)")
+    parser.add_argument('--channels', help="comma separated channels to log (default all)")
+    parser.add_argument('--rotate-mb', type=float,
+                        help="start a new log file after this many megabytes")
+    parser.add_argument('--capacity', type=int, default=8192,
+                        help="rows kept in memory between log writes")
+    parser.add_argument('--flush-interval', type=float, default=0.5,
+                        help="seconds between log writes")
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help="seconds between throughput reports (0 to disable)")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--shared-memory', metavar='NAME',
+                        help="also publish telemetry to this shared memory ring")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="also stream telemetry to TCP/WebSocket subscribers")
+    parser.add_argument('--serve-unix', metavar='PATH',
+                        help="also stream telemetry to subscribers on a Unix socket")
+    parser.add_argument('--velocity-window', type=int, default=9,
+                        help="samples in the encoder velocity fit (0 disables encoder unwrapping)")
+    parser.add_argument('--track', action='append', default=[], metavar='CHANNEL:FREQ',
+                        help="track frequencies with a sliding DFT, e.g. speed1,speed2:12.5,25")
+    parser.add_argument('--track-window', type=int, default=256,
+                        help="samples in each tracked frequency's window")
+    parser.add_argument('--alarms', metavar='FILE',
+                        help="JSON alarm rules instead of the defaults ('none' to disable)")
+    parser.add_argument('--alarm-log', default='alarm_events.csv', metavar='FILE',
+                        help="CSV file alarm events are appended to ('none' to disable)")
+    return parser
+
+def parse_args(argv=None):
+    parser = build_parser()
+    args, _ = parser.parse_known_args(argv)
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        unknown = set(config) - {action.dest for action in parser._actions}
+        if unknown:
+            parser.error(f"unknown options in {args.config}: {', '.join(sorted(unknown))}")
+        parser.set_defaults(**config)
+    return parser.parse_args(argv)
+
+def format_stats(elapsed, rate, logger, acquisition, alarms=None):
+    parts = [f"{elapsed:7.1f}s", f"{rate:7.1f} rows/s"]
+    if logger is not None:
+        parts.append(f"logged {logger.rows} rows ({logger.bytes_written() / 1e6:.2f} MB)")
+    if alarms is not None and alarms.events:
+        stats = alarms.stats()
+        parts.append(f"alarms: {stats['active']} active, {stats['events']} events, "
+                     f"{stats['trips']} trips")
+    for name, info in acquisition.stats().items():
+        parts.append(f"{name}: {info['state']} {info['frames']} frames, "
+                     f"{info['dropped_lines']} dropped, {info['reconnects']} reconnects")
+    return " | ".join(parts)
+
+def run(args):
+    from telemetry import TelemetryStore
+    from acquisition import AcquisitionManager, SIMULATED, parse_device_spec
+    from sensor_interface import FRAME_FIELDS, GyroSensor
+
+    stages = []
+    if args.velocity_window:
+        from encoder import EncoderStage
+        stages.append(EncoderStage(window=args.velocity_window))
+    if args.fusion != 'none':
+        from fusion import FusionStage, FILTERS
+        stages.append(FusionStage(FILTERS[args.fusion]()))
+    if args.track:
+        from tone_tracker import ToneStage, parse_track_spec
+        stages.extend(ToneStage(*parse_track_spec(spec), window=args.track_window)
+                      for spec in args.track)
+    store = TelemetryStore(FRAME_FIELDS + [name for stage in stages for name in stage.outputs]
+                           + [SIMULATED], capacity=args.capacity)
+    acquisition = AcquisitionManager(
+        store, on_state=lambda name, state: print(f"{name}: {state}"), stages=stages)
+
+    # Over-limit rules turn the motor's torque off straight from the
+    # acquisition thread
+    from alarms import AlarmEngine, DEFAULT_RULES, load_rules
+    alarms = None
+    if args.alarms != 'none':
+        alarms = AlarmEngine(store, DEFAULT_RULES if args.alarms is None else load_rules(args.alarms),
+                             trip=lambda motor: acquisition.send('torque_off', motor),
+                             log_path=None if args.alarm_log == 'none' else args.alarm_log)
+
+    logger = None
+    if args.log != 'none':
+        from session_log import SessionLogger
+        path = args.log or datetime.now().strftime("session_%Y%m%d_%H%M%S.csv")
+        logger = SessionLogger(store, path,
+                               channels=args.channels.split(',') if args.channels else None,
+                               rotate_bytes=args.rotate_mb * 1e6 if args.rotate_mb else None)
+        print(f"Logging to {path}")
+
+    publisher = server = None
+    if args.shared_memory:
+        from shared_telemetry import SharedTelemetryPublisher
+        publisher = SharedTelemetryPublisher(store, args.shared_memory)
+    if args.serve or args.serve_unix:
+        from telemetry_server import TelemetryServer, parse_address
+        host, port = parse_address(args.serve) if args.serve else (None, None)
+        server = TelemetryServer(store, host, port, args.serve_unix)
+        server.start()
+
+    # A headless recorder keeps waiting for its devices instead of giving up
+    if args.port:
+        acquisition.connect(args.port, baud_rate=args.baud, retry_initial=True)
+    for spec in args.device:
+        device = parse_device_spec(spec)
+        device.retry_initial = True
+        acquisition.add_device(device)
+    simulator = GyroSensor(open_port=False) if args.simulate else None
+    if not acquisition.devices and simulator is None:
+        print("No --port, --device or --simulate given, nothing to record")
+        return 2
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    started = time.monotonic()
+    last_stats = started
+    last_flush = started
+    stats_seq = store.count
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            if args.duration is not None and now - started >= args.duration:
+                break
+            if simulator is not None and acquisition.idle():
+                acquisition.simulate(simulator.generate_test_frame())
+            if logger is not None and now - last_flush >= args.flush_interval:
+                _, skipped = logger.write_pending()
+                if skipped:
+                    print(f"Warning: {skipped} rows dropped before logging, raise --capacity")
+                last_flush = now
+            if args.stats_interval and now - last_stats >= args.stats_interval:
+                rate = (store.count - stats_seq) / (now - last_stats)
+                print(format_stats(now - started, rate, logger, acquisition, alarms))
+                stats_seq = store.count
+                last_stats = now
+            stop.wait(SIMULATION_INTERVAL)
+    finally:
+        acquisition.stop()
+        if alarms is not None:
+            alarms.close()
+        if server is not None:
+            server.stop()
+        if publisher is not None:
+            publisher.close()
+        if logger is not None:
+            logger.close()
+            print(f"Logged {logger.rows} rows to {', '.join(logger.files)}")
+    return 0
+
+def main(argv=None):
+    return run(parse_args(argv))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,19 @@
+import time
+STARTUP_TIME = time.perf_counter()  # Reference point for startup metrics
+
 import sys
-import numpy as np
+import math
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QLabel, QLineEdit, 
                             QGridLayout, QFrame, QSpinBox, QTabWidget, QStyleFactory, QComboBox)
-from PyQt5.QtCore import QTimer, Qt, QRect
+from PyQt5.QtCore import QTimer, Qt, QRect, QObject, pyqtSignal
 from PyQt5.QtGui import QPainter, QColor, QPen, QFont, QBrush, QIntValidator
-import pyqtgraph as pg
-from sensor_interface import GyroSensor
-from fft_processor import FFTProcessor
+from render_scheduler import FrameScheduler
 import csv
 from datetime import datetime
-import serial.tools.list_ports
-import time
+
+# pyqtgraph, NumPy, pyserial and scipy are imported where they are first
+# needed so the window can appear before they finish loading
 
 STYLES = {
     'BACKGROUND': '#ffffff',
@@ -32,6 +34,55 @@ STYLES = {
     'BORDER': '#e0e0e0'
 }
 
+ACQUISITION_INTERVAL_MS = 50
+
+def startupElapsed():
+    return time.perf_counter() - STARTUP_TIME
+
+MOTOR_DATA_TYPES = ['position', 'speed', 'torque', 'temp', 'voltage']
+BUFFER_SAMPLES = 120  # Recent readings kept for saving
+
+def frameToMotorData(frame):
+    # Regroup a flat sensor frame (see sensor_interface.FRAME_FIELDS) per motor
+    data = {}
+    for k, data_type in enumerate(MOTOR_DATA_TYPES):
+        data[data_type] = {f"M{i+1}": frame[3 + 3 * k + i] for i in range(3)}
+    return data
+
+def formatValue(value, unit, decimals=2):
+    # NaN marks a gap in the data stream
+    if value != value:
+        return "--"
+    return f"{value:.{decimals}f}{unit}"
+
+class ConnectionSignals(QObject):
+    # Bridges AcquisitionManager callbacks from its threads to the GUI thread
+    stateChanged = pyqtSignal(str, str)
+    portsChanged = pyqtSignal(list)
+
+SPECTRUM_SIZE = 128
+SPECTROGRAM_SECONDS = 30
+
+# Plot history windows in seconds, None shows the whole session
+HISTORY_OPTIONS = {'6 s': 6, '1 min': 60, '10 min': 600, '1 h': 3600, 'Session': None}
+
+# Rolling statistics next to the current values: window in seconds (None
+# for the whole session, see TelemetryStore stats_windows) and the figure
+# shown under each value; the tooltip lists all of them
+STATS_OPTIONS = {'1 s': 1.0, '10 s': 10.0, '1 min': 60.0, 'Session': None}
+STATS_DISPLAY = ['Mean ± SD', 'RMS', 'Min / Max', 'Peak-to-peak']
+VALUE_CHANNELS = {'Current Position': ('position', 'enc', "°"),
+                  'Current Speed': ('speed', 'speed', " rpm"),
+                  'Current Torque': ('torque', 'torque', "%"),
+                  'Current Temperature': ('temp', 'temp', "°C"),
+                  'Current Voltage': ('voltage', 'voltage', "V")}
+
+# Limits for synchronized moves: degrees for positions, raw units for velocity
+PROFILE_OPTIONS = {'S-curve': 'scurve', 'Trapezoid': 'trapezoid'}
+MOVE_LIMITS = {'velocity': 90.0, 'acceleration': 180.0, 'jerk': 720.0}
+VELOCITY_RAMP_LIMITS = {'acceleration': 1024.0, 'jerk': 4096.0}
+VELOCITY_STREAM_RATE = 50  # Velocity setpoints per second sent over serial
+
 class CircularGauge(QWidget):
     def __init__(self, title="", parent=None):
         super().__init__(parent)
@@ -40,6 +91,8 @@ class CircularGauge(QWidget):
         self.setMinimumSize(200, 200)
         
     def setValue(self, value):
+        if value != value:  # Keep the last reading across gaps
+            return
         self.value = value
         self.update()
         
@@ -55,31 +108,87 @@ class CircularGauge(QWidget):
         
         # Draw ticks and numbers
         for i in range(0, 360, 20):
-            angle = np.radians(i)
-            start_point = (center.x() + (radius-10) * np.sin(angle),
-                         center.y() - (radius-10) * np.cos(angle))
-            end_point = (center.x() + radius * np.sin(angle),
-                        center.y() - radius * np.cos(angle))
+            angle = math.radians(i)
+            start_point = (center.x() + (radius-10) * math.sin(angle),
+                         center.y() - (radius-10) * math.cos(angle))
+            end_point = (center.x() + radius * math.sin(angle),
+                        center.y() - radius * math.cos(angle))
             painter.drawLine(int(start_point[0]), int(start_point[1]),
                            int(end_point[0]), int(end_point[1]))
             
             # Draw numbers
-            number_point = (center.x() + (radius-25) * np.sin(angle),
-                          center.y() - (radius-25) * np.cos(angle))
+            number_point = (center.x() + (radius-25) * math.sin(angle),
+                          center.y() - (radius-25) * math.cos(angle))
             painter.drawText(int(number_point[0]-15), int(number_point[1]+5), 
                            str(i))
         
         # Draw needle
         painter.setPen(QPen(QColor(STYLES['MOTOR1_COLOR']), 3))
-        angle = np.radians(self.value)
-        end_point = (center.x() + (radius-20) * np.sin(angle),
-                    center.y() - (radius-20) * np.cos(angle))
+        angle = math.radians(self.value)
+        end_point = (center.x() + (radius-20) * math.sin(angle),
+                    center.y() - (radius-20) * math.cos(angle))
         painter.drawLine(center.x(), center.y(),
                         int(end_point[0]), int(end_point[1]))
         
         # Draw value
         painter.drawText(10, self.height()-10, f"{self.title}= {self.value:.4f}°")
 
+class HistoryPlot:
+    # Draws long-history series from a shared min/max pyramid, fetching at
+    # most ~2 points per pixel for whatever time range is currently visible
+    RAW_SAMPLES = 65536  # Newest samples kept at full resolution
+    
+    def __init__(self, plot, history_seconds=6):
+        self.plot = plot
+        self.history_seconds = history_seconds
+        self.follow = True
+        self.curves = []
+        self.pyramid = None
+        # Manual zoom/pan freezes the view so the zoomed range gets finer levels
+        plot.getViewBox().sigRangeChangedManually.connect(self.stopFollowing)
+        
+    def addSeries(self, color, name):
+        from decimation import MinMaxPyramid
+        self.curves.append(self.plot.plot([], [], pen=color, name=name))
+        self.pyramid = MinMaxPyramid(columns=len(self.curves), max_raw=self.RAW_SAMPLES)
+        
+    def append(self, times, values):
+        # values is a (samples, series) block in addSeries order
+        self.pyramid.append(times, values)
+        
+    def setHistory(self, seconds):
+        self.history_seconds = seconds
+        self.follow = True
+        
+    def stopFollowing(self, *args):
+        self.follow = False
+        
+    def clear(self):
+        self.pyramid.clear()
+        for curve in self.curves:
+            curve.setData([], [])
+        self.follow = True
+            
+    def render_data(self, scheduler=None):
+        pyramid = self.pyramid
+        if pyramid is None or not len(pyramid):
+            return
+        
+        if self.follow:
+            x1 = pyramid.last_x()
+            x0 = pyramid.first_x() if self.history_seconds is None else x1 - self.history_seconds
+            self.plot.setXRange(x0, max(x1, x0 + 1e-3), padding=0)
+        else:
+            x0, x1 = self.plot.getViewBox().viewRange()[0]
+        
+        max_points = 2 * max(100, int(self.plot.getViewBox().width()))
+        if scheduler is not None:
+            max_points = scheduler.point_budget(max_points)
+        
+        x, y = pyramid.query(x0, x1, max_points)
+        for i, curve in enumerate(self.curves):
+            curve.setData(x, y[:, i], connect='finite')
+
 class ArtificialHorizon(QWidget):
     def __init__(self):
         super().__init__()
@@ -143,10 +252,16 @@ class ArtificialHorizon(QWidget):
             painter.end()
 
 class ArtificialHorizonTab(QWidget):
-    def __init__(self):
+    def __init__(self, channels=()):
         super().__init__()
         self.layout = QVBoxLayout(self)
         
+        # Prefer the fused orientation when the acquisition path provides it
+        channels = list(channels)
+        self.fused_idx = None
+        if all(name in channels for name in ['fused_pitch', 'fused_roll', 'fused_yaw']):
+            self.fused_idx = [channels.index(name) for name in ['fused_pitch', 'fused_roll', 'fused_yaw']]
+        
         self.horizon = ArtificialHorizon()
         self.layout.addWidget(self.horizon)
         
@@ -161,17 +276,30 @@ class ArtificialHorizonTab(QWidget):
             
         self.layout.addLayout(values_layout)
         
-    def update_data(self):
-        t = time.time()
-        # Create smooth oscillating values
-        pitch = 125 + 25 * np.sin(t * 0.5)
-        roll = 195 + 25 * np.sin(t * 0.5 + 2)
-        yaw = 260 + 25 * np.sin(t * 0.5 + 4)
-        
-        self.horizon.setPitchRoll(pitch, roll)
-        self.pitch_label.setText(f"Pitch= {pitch:.4f}°")
-        self.roll_label.setText(f"Roll= {roll:.4f}°")
-        self.yaw_label.setText(f"Yaw= {yaw:.4f}°")
+        self.angles = (0.0, 0.0, 0.0)
+        
+    def acquire_data(self, times=(), rows=()):
+        if len(rows):
+            frame = rows[-1]
+            self.angles = frame[:3]
+            if self.fused_idx is not None:
+                fused = [frame[i] for i in self.fused_idx]
+                if all(value == value for value in fused):
+                    self.angles = fused
+        
+    def render_data(self, scheduler=None):
+        if scheduler is not None and not scheduler.should_repaint_gauges():
+            return
+        pitch, roll, yaw = self.angles
+        if pitch == pitch and roll == roll:
+            self.horizon.setPitchRoll(pitch, roll)
+        self.pitch_label.setText(f"Pitch= {formatValue(pitch, '°', 4)}")
+        self.roll_label.setText(f"Roll= {formatValue(roll, '°', 4)}")
+        self.yaw_label.setText(f"Yaw= {formatValue(yaw, '°', 4)}")
+        
+    def update_data(self, times=(), rows=()):
+        self.acquire_data(times, rows)
+        self.render_data()
 
 class EncoderTab(QWidget):
     def __init__(self):
@@ -189,6 +317,16 @@ class EncoderTab(QWidget):
         
         self.layout.addLayout(gauges_layout)
         
+        self.history_box = QComboBox()
+        self.history_box.addItems(HISTORY_OPTIONS.keys())
+        self.history_box.currentTextChanged.connect(self.setHistory)
+        history_layout = QHBoxLayout()
+        history_layout.addWidget(QLabel("History"))
+        history_layout.addWidget(self.history_box)
+        history_layout.addStretch()
+        self.layout.addLayout(history_layout)
+        
+        import pyqtgraph as pg
         self.plot = pg.PlotWidget(title="Encoder Values")
         self.plot.setBackground('w')
         self.plot.showGrid(x=True, y=True)
@@ -198,58 +336,59 @@ class EncoderTab(QWidget):
         
         self.layout.addWidget(self.plot)
         
-    def update_data(self):
-        t = time.time()
-        # Create smooth oscillating values
-        e1 = 125 + 25 * np.sin(t * 0.5)
-        e2 = 195 + 25 * np.sin(t * 0.5 + 2)
-        e3 = 260 + 25 * np.sin(t * 0.5 + 4)
-        
-        self.encoder1.setValue(e1)
-        self.encoder2.setValue(e2)
-        self.encoder3.setValue(e3)
+        self.start_time = time.monotonic()
+        self.encoder_values = None  # Latest E1..E3 reading
         
-        # Update plot data
-        if not hasattr(self, 'time_data'):
-            self.time_data = list(range(120))
-            self.encoder_data = {'E1': [], 'E2': [], 'E3': []}
-        
-        # Add new data points
-        self.encoder_data['E1'].append(e1)
-        self.encoder_data['E2'].append(e2)
-        self.encoder_data['E3'].append(e3)
-        
-        # Keep last 120 points
-        for key in self.encoder_data:
-            if len(self.encoder_data[key]) > 120:
-                self.encoder_data[key].pop(0)
-        
-        # Update plot
-        self.plot.clear()
         colors = {'E1': STYLES['MOTOR1_COLOR'], 
                   'E2': STYLES['MOTOR2_COLOR'], 
                   'E3': STYLES['MOTOR3_COLOR']}
+        self.history = HistoryPlot(self.plot)
         for key, color in colors.items():
-            self.plot.plot(self.time_data[:len(self.encoder_data[key])], 
-                          self.encoder_data[key], 
-                          pen=color, name=key)
+            self.history.addSeries(color, key)
+            
+    def setHistory(self, text):
+        self.history.setHistory(HISTORY_OPTIONS[text])
+        
+    def acquire_data(self, times=(), rows=()):
+        if len(times):
+            self.history.append(times - self.start_time, rows[:, 3:6])
+            self.encoder_values = rows[-1, 3:6]
+                
+    def render_data(self, scheduler=None):
+        if self.encoder_values is None:
+            return
+        
+        if scheduler is None or scheduler.should_repaint_gauges():
+            self.encoder1.setValue(self.encoder_values[0])
+            self.encoder2.setValue(self.encoder_values[1])
+            self.encoder3.setValue(self.encoder_values[2])
+        
+        # Update plot
+        self.history.render_data(scheduler)
+            
+    def update_data(self, times=(), rows=()):
+        self.acquire_data(times, rows)
+        self.render_data()
 
 class MotorControlTab(QWidget):
-    def __init__(self):
+    def __init__(self, connection=None, controller=None, store=None):
         super().__init__()
+        self.connection = connection
+        self.store = store  # telemetry.TelemetryStore, source of the rolling statistics
+        self.controller = controller  # control.ControlEngine, closes the position loops
+        self.commanded_velocity = [0.0, 0.0, 0.0]
         self.layout = QVBoxLayout(self)
         
-        # Initialize data buffers
-        self.data_buffer = {
-            'position': {'M1': [], 'M2': [], 'M3': []},
-            'speed': {'M1': [], 'M2': [], 'M3': []},
-            'torque': {'M1': [], 'M2': [], 'M3': []},
-            'temp': {'M1': [], 'M2': [], 'M3': []},
-            'voltage': {'M1': [], 'M2': [], 'M3': []}
-        }
+        # Last BUFFER_SAMPLES motor readings (columns as in the frame,
+        # position M1 to voltage M3) and their monotonic arrival times
+        self.data_buffer = None
+        self.time_buffer = None
         
+        self.latest_data = None
+        self.start_time = time.monotonic()
         self.is_paused = False
         self.filter_enabled = False
+        self.filter_state = None
         
         self.initUI()
         self.connectSignals()
@@ -259,24 +398,17 @@ class MotorControlTab(QWidget):
             for input_widget in input_list:
                 input_widget.setValidator(QIntValidator())
         
-    def updatePlots(self):
+    def updatePlots(self, scheduler=None):
         try:
-            # Create time data for x-axis
-            time_data = np.linspace(0, 6, len(next(iter(self.data_buffer['speed'].values()))))
-            
-            # Update each plot
-            for data_type, plot in self.plots.items():
-                plot.clear()
-                for motor, color in [('M1', STYLES['MOTOR1_COLOR']), 
-                                   ('M2', STYLES['MOTOR2_COLOR']), 
-                                   ('M3', STYLES['MOTOR3_COLOR'])]:
-                    if len(self.data_buffer[data_type][motor]) > 0:
-                        plot.plot(time_data[-len(self.data_buffer[data_type][motor]):],
-                                self.data_buffer[data_type][motor],
-                                pen=color, name=f"Motor {motor[1]}")
+            for history in self.history_plots.values():
+                history.render_data(scheduler)
         except Exception as e:
             print(f"Error updating plots: {str(e)}")
 
+    def setHistory(self, text):
+        for history in self.history_plots.values():
+            history.setHistory(HISTORY_OPTIONS[text])
+
     def initUI(self):
         # Main horizontal layout to split controls and graphs
         main_layout = QHBoxLayout()
@@ -308,9 +440,13 @@ class MotorControlTab(QWidget):
         self.filter_btn = self.createStyledButton("FILTER", STYLES['BUTTON_BLUE'])
         self.home_btn = self.createStyledButton("SET HOME", STYLES['BUTTON_BLUE'])
         
+        self.history_box = QComboBox()
+        self.history_box.addItems(HISTORY_OPTIONS.keys())
+        
         top_controls.addWidget(self.pause_btn)
         top_controls.addWidget(self.filter_btn)
         top_controls.addWidget(self.home_btn)
+        top_controls.addWidget(self.history_box)
         right_panel.addLayout(top_controls)
         
         # Motor controls
@@ -352,6 +488,11 @@ class MotorControlTab(QWidget):
         self.set_torque_btn = self.createStyledButton("Set Torque", STYLES['BUTTON_BLUE'])
         layout.addWidget(self.set_torque_btn, row, 4)
         
+        # Motion profile used by the sync buttons
+        self.profile_box = QComboBox()
+        self.profile_box.addItems(list(PROFILE_OPTIONS))
+        layout.addWidget(self.profile_box, row, 5)
+        
         # Position controls
         row += 1
         layout.addWidget(QLabel("Position (0-300°)"), row, 0)
@@ -386,11 +527,10 @@ class MotorControlTab(QWidget):
         
         # Create combobox for COM ports instead of line edit
         self.com_box = QComboBox()
-        self.updateComPorts()  # Initial port list
         self.com_box.setFixedWidth(100)
         
         self.refresh_btn = self.createStyledButton("REFRESH", STYLES['BUTTON_BLUE'])
-        self.refresh_btn.clicked.connect(self.updateComPorts)
+        self.updateComPorts()  # Initial port list, filled in from a worker thread
         
         self.connect_btn = self.createStyledButton("CONNECT", STYLES['BUTTON_BLUE'])
         self.connect_label = QLabel("DISCONNECTED")
@@ -424,8 +564,11 @@ class MotorControlTab(QWidget):
         layout.addLayout(com_group)
 
     def setupGraphs(self, layout):
+        import pyqtgraph as pg
+        
         # Create plots with proper styling
         self.plots = {}
+        self.history_plots = {}
         plot_configs = {
             'speed': ('Speed', 'RPM', (-10, 120)),
             'torque': ('Torque', '%', (0, 100)),
@@ -455,6 +598,14 @@ class MotorControlTab(QWidget):
             layout.addWidget(plot, row, col)
             self.plots[data_type] = plot
             
+            # Full-session history drawn through a min/max pyramid
+            history = HistoryPlot(plot)
+            for motor, color in [('M1', STYLES['MOTOR1_COLOR']), 
+                               ('M2', STYLES['MOTOR2_COLOR']), 
+                               ('M3', STYLES['MOTOR3_COLOR'])]:
+                history.addSeries(color, f"Motor {motor[1]}")
+            self.history_plots[data_type] = history
+            
             col = (col + 1) % 2
             if col == 0:
                 row += 1
@@ -521,6 +672,7 @@ class MotorControlTab(QWidget):
         """
 
     def createStyledPlot(self, title, ymin, ymax):
+        import pyqtgraph as pg
         plot = pg.PlotWidget(title=title)
         plot.setBackground('w')
         plot.showGrid(x=True, y=True)
@@ -546,6 +698,7 @@ class MotorControlTab(QWidget):
         self.connect_btn.clicked.connect(self.connectPort)
         self.disconnect_btn.clicked.connect(self.disconnectPort)
         self.save_btn.clicked.connect(self.saveData)
+        self.history_box.currentTextChanged.connect(self.setHistory)
         
         # Connect motor control buttons
         self.set_torque_btn.clicked.connect(self.setTorqueLimit)
@@ -553,33 +706,53 @@ class MotorControlTab(QWidget):
         self.sync_position_btn.clicked.connect(self.syncPosition)
         self.set_velocity_btn.clicked.connect(self.setVelocity)
         self.sync_velocity_btn.clicked.connect(self.syncVelocity)
+        self.stop_btn.clicked.connect(self.stopApplication)
 
-    def update_data(self):
-        if not self.is_paused:
-            try:
-                # Get test data
-                test_data = self.generateTestData()
-                
-                # Update encoder gauges with position data
-                for i, motor in enumerate(['M1', 'M2', 'M3']):
-                    self.encoder_gauges[i].setValue(test_data['position'][motor])
-                
-                # Update data buffers and UI
+    def acquire_data(self, times=(), rows=()):
+        if self.is_paused or not len(times):
+            return
+        try:
+            import numpy as np
+            frame = rows[-1].copy()
+            values = rows[:, 3:18]
+            if self.filter_enabled:
+                values = self.apply_filter(values)
+                frame[3:18] = values[-1]
+            
+            # Update data buffers
+            if self.data_buffer is None:
+                self.data_buffer, self.time_buffer = values[-BUFFER_SAMPLES:], times[-BUFFER_SAMPLES:]
+            else:
+                self.data_buffer = np.concatenate([self.data_buffer, values])[-BUFFER_SAMPLES:]
+                self.time_buffer = np.concatenate([self.time_buffer, times])[-BUFFER_SAMPLES:]
+            
+            t = times - self.start_time
+            for k, data_type in enumerate(MOTOR_DATA_TYPES):
+                if data_type in self.history_plots:
+                    self.history_plots[data_type].append(t, values[:, 3 * k:3 * k + 3])
+            self.latest_data = frameToMotorData(frame)
+            
+        except Exception as e:
+            print(f"Error updating data: {str(e)}")
+
+    def render_data(self, scheduler=None):
+        if self.is_paused or self.latest_data is None:
+            return
+        try:
+            # Encoder gauges and value displays are the cheapest thing to drop
+            if scheduler is None or scheduler.should_repaint_gauges():
                 for i, motor in enumerate(['M1', 'M2', 'M3']):
-                    for data_type in ['position', 'speed', 'torque', 'temp', 'voltage']:
-                        value = test_data[data_type][motor]
-                        if self.filter_enabled:
-                            value = self.apply_filter(value)
-                        self.data_buffer[data_type][motor].append(value)
-                        while len(self.data_buffer[data_type][motor]) > 120:
-                            self.data_buffer[data_type][motor].pop(0)
-                
-                # Update displays and plots
-                self.updateValueDisplays(test_data)
-                self.updatePlots()
-                
-            except Exception as e:
-                print(f"Error updating data: {str(e)}")
+                    self.encoder_gauges[i].setValue(self.latest_data['position'][motor])
+                self.updateValueDisplays(self.latest_data, self.valueStats())
+            
+            self.updatePlots(scheduler)
+            
+        except Exception as e:
+            print(f"Error rendering data: {str(e)}")
+
+    def update_data(self, times=(), rows=()):
+        self.acquire_data(times, rows)
+        self.render_data()
 
     def togglePause(self):
         self.is_paused = not self.is_paused
@@ -595,6 +768,7 @@ class MotorControlTab(QWidget):
 
     def toggleFilter(self):
         self.filter_enabled = not self.filter_enabled
+        self.filter_state = None
         self.filter_btn.setStyleSheet(
             self.createStyledButton("FILTER", 
                                   STYLES['BUTTON_GREEN'] if self.filter_enabled else STYLES['BUTTON_BLUE']).styleSheet()
@@ -611,9 +785,13 @@ class MotorControlTab(QWidget):
         }
         
         # Clear data buffers
-        for data_type in self.data_buffer:
-            for motor in self.data_buffer[data_type]:
-                self.data_buffer[data_type][motor].clear()
+        self.data_buffer = None
+        self.time_buffer = None
+        for history in self.history_plots.values():
+            history.clear()
+        self.start_time = time.monotonic()
+        if self.store is not None:
+            self.store.reset_stats()
         
         # Update displays with zero values
         self.updateValueDisplays(self.home_values)
@@ -630,25 +808,14 @@ class MotorControlTab(QWidget):
         )
 
     def refreshPort(self):
-        try:
-            port = self.com_box.currentText()
-            if hasattr(self.parent(), 'sensor'):
-                self.parent().sensor.disconnect()
-            self.parent().sensor = GyroSensor(port=port)
-            if self.parent().sensor.connected:
-                self.connect_label.setText("CONNECTED")
-                self.connect_label.setStyleSheet(f"background-color: {STYLES['CONNECTED_GREEN']}; padding: 5px;")
-            else:
-                self.connect_label.setText("DISCONNECTED")
-                self.connect_label.setStyleSheet("background-color: red; padding: 5px;")
-        except Exception as e:
-            print(f"Error connecting to port: {e}")
-            self.connect_label.setText("DISCONNECTED")
-            self.connect_label.setStyleSheet("background-color: red; padding: 5px;")
+        # Reopen the selected port, e.g. after changing the selection
+        self.connectPort()
 
     def stopApplication(self):
         # Stop all motors
         try:
+            if self.controller is not None:
+                self.controller.release()
             for i, motor in enumerate(['M1', 'M2', 'M3']):
                 # Set velocity and torque to 0
                 self.velocity_inputs[i].setText("0")
@@ -666,26 +833,22 @@ class MotorControlTab(QWidget):
         except Exception as e:
             print(f"Error stopping application: {e}")
 
-    def apply_filter(self, value, alpha=0.2):
-        if not hasattr(self, '_last_values'):
-            self._last_values = {}
-        
-        key = str(id(value))  # Create unique key for each data stream
-        if key not in self._last_values:
-            self._last_values[key] = value
-        
-        filtered = alpha * value + (1 - alpha) * self._last_values[key]
-        self._last_values[key] = filtered
+    def apply_filter(self, values, alpha=0.2):
+        # Exponential smoothing of each column, continuing from the previous
+        # block; gap rows stay NaN and a column restarts from its next value
+        import numpy as np
+        filtered = np.empty_like(values)
+        state = self.filter_state
+        for i, row in enumerate(values):
+            state = row if state is None else np.where(np.isfinite(state),
+                                                       alpha * row + (1 - alpha) * state, row)
+            filtered[i] = state
+        self.filter_state = state
         return filtered
 
     def disconnectPort(self):
-        try:
-            if hasattr(self.parent(), 'sensor'):
-                self.parent().sensor.disconnect()
-            self.connect_label.setText("DISCONNECTED")
-            self.connect_label.setStyleSheet("background-color: red; padding: 5px;")
-        except Exception as e:
-            print(f"Error disconnecting: {e}")
+        if self.connection is not None:
+            self.connection.disconnect()
 
     def setTorqueLimit(self):
         try:
@@ -693,6 +856,11 @@ class MotorControlTab(QWidget):
                 torque = int(self.torque_inputs[i].text())
                 if 0 <= torque <= 100:
                     print(f"Setting {motor} torque to {torque}%")
+                    # The torque limit also bounds the controller's effort output
+                    if self.controller is not None:
+                        self.controller.set_output_limit(i, torque)
+                    if self.connection is not None:
+                        self.connection.send('torque_limit', i + 1, torque)
         except ValueError:
             print("Invalid torque value")
 
@@ -702,6 +870,8 @@ class MotorControlTab(QWidget):
                 position = int(self.position_inputs[i].text())
                 if 0 <= position <= 300:
                     print(f"Setting {motor} position to {position}°")
+                    if self.controller is not None:
+                        self.controller.set_setpoint(i, position)
         except ValueError:
             print("Invalid position value")
 
@@ -711,15 +881,41 @@ class MotorControlTab(QWidget):
             if 0 <= position <= 300:
                 for motor in ['M1', 'M2', 'M3']:
                     print(f"Syncing {motor} to position {position}°")
+                if self.controller is not None:
+                    # One time-scaled profile per motor, all arriving together
+                    from trajectory import plan_move
+                    trajectory = plan_move(self.currentPositions(position), [position] * 3,
+                                           MOVE_LIMITS['velocity'], MOVE_LIMITS['acceleration'],
+                                           MOVE_LIMITS['jerk'],
+                                           PROFILE_OPTIONS[self.profile_box.currentText()],
+                                           rate=self.controller.rate)
+                    self.controller.follow(trajectory)
+                    print(f"Synchronized move takes {trajectory.duration:.2f}s")
         except ValueError:
             print("Invalid position value")
 
+    def currentPositions(self, default):
+        # Measured positions, falling back to the active setpoint or the target
+        positions = []
+        for i, motor in enumerate(['M1', 'M2', 'M3']):
+            value = self.latest_data['position'][motor] if self.latest_data else math.nan
+            if math.isnan(value):
+                setpoint = self.controller.loops[i].setpoint
+                value = default if setpoint is None else setpoint
+            positions.append(value)
+        return positions
+
     def setVelocity(self):
         try:
+            if self.controller is not None:
+                self.controller.cancel()
             for i, motor in enumerate(['M1', 'M2', 'M3']):
                 velocity = int(self.velocity_inputs[i].text())
                 if 0 <= velocity <= 2047:
                     print(f"Setting {motor} velocity to {velocity}")
+                    if self.connection is not None:
+                        self.connection.send('velocity', i + 1, velocity)
+                    self.commanded_velocity[i] = velocity
         except ValueError:
             print("Invalid velocity value")
 
@@ -729,6 +925,17 @@ class MotorControlTab(QWidget):
             if 0 <= velocity <= 2047:
                 for motor in ['M1', 'M2', 'M3']:
                     print(f"Syncing {motor} to velocity {velocity}")
+                if self.controller is not None:
+                    # Ramp every motor from its last commanded velocity so that
+                    # all of them reach the new one at the same moment
+                    from trajectory import plan_velocity
+                    trajectory = plan_velocity(self.commanded_velocity, [velocity] * 3,
+                                               VELOCITY_RAMP_LIMITS['acceleration'],
+                                               VELOCITY_RAMP_LIMITS['jerk'],
+                                               PROFILE_OPTIONS[self.profile_box.currentText()],
+                                               rate=VELOCITY_STREAM_RATE)
+                    self.controller.follow(trajectory)
+                    self.commanded_velocity = [float(velocity)] * 3
         except ValueError:
             print("Invalid velocity value")
 
@@ -746,37 +953,53 @@ class MotorControlTab(QWidget):
                     "M1_Voltage", "M2_Voltage", "M3_Voltage"
                 ])
                 
-                data_length = len(self.data_buffer['speed']['M1'])
-                for i in range(data_length):
-                    row = [f"{i/20:.1f}"]  # Time
-                    for data_type in ['speed', 'torque', 'temp', 'voltage']:
-                        for motor in ['M1', 'M2', 'M3']:
-                            row.append(f"{self.data_buffer[data_type][motor][i]:.2f}")
-                    writer.writerow(row)
+                # Samples arrive with jitter, write them on a uniform time grid
+                # at the measured rate, with gaps left as NaN
+                from resampling import resample, estimate_rate
+                import numpy as np
+                if self.data_buffer is None:
+                    raise ValueError("not enough data")
+                values = self.data_buffer[:, 3:]  # Speed to voltage, M1..M3 each
+                times = self.time_buffer
+                rate = estimate_rate(times)
+                if rate is None:
+                    raise ValueError("not enough data")
+                grid, uniform = resample(times, values, rate)
+                for t, values in zip(grid - grid[0], uniform):
+                    writer.writerow([f"{t:.3f}"] + [f"{value:.2f}" for value in values])
             print(f"Data saved to {filename}")
         except Exception as e:
             print(f"Error saving data: {e}")
 
     def connectPort(self):
-        try:
-            port = self.com_box.currentText()
-            self.sensor = GyroSensor(port=port)  # Create sensor in the tab itself
-            
-            if self.sensor.connected:
-                self.connect_label.setText("CONNECTED")
-                self.connect_label.setStyleSheet(
-                    f"background-color: {STYLES['CONNECTED_GREEN']}; padding: 5px; border-radius: 3px;"
-                )
-                self.connect_btn.setEnabled(False)
-                self.disconnect_btn.setEnabled(True)
-                
-                # Update motor status indicators
-                for status in self.motor_status:
-                    status.setStyleSheet("QLabel { color: green; font-size: 24px; padding: 5px; }")
-            else:
-                self.showConnectionError()
-        except Exception as e:
-            print(f"Error connecting to port: {e}")
+        # Opening the port happens on the connection thread, the result
+        # arrives through setConnectionState
+        port = self.com_box.currentText()
+        if self.connection is None or not port:
+            self.showConnectionError()
+            return
+        self.connection.connect(port)
+
+    def setConnectionState(self, state):
+        if state == 'connected':
+            self.connect_label.setText("CONNECTED")
+            self.connect_label.setStyleSheet(
+                f"background-color: {STYLES['CONNECTED_GREEN']}; padding: 5px; border-radius: 3px;"
+            )
+            self.connect_btn.setEnabled(False)
+            self.disconnect_btn.setEnabled(True)
+            
+            # Update motor status indicators
+            for status in self.motor_status:
+                status.setStyleSheet("QLabel { color: green; font-size: 24px; padding: 5px; }")
+        elif state in ('connecting', 'reconnecting'):
+            self.connect_label.setText(state.upper() + "...")
+            self.connect_label.setStyleSheet("background-color: orange; padding: 5px; border-radius: 3px;")
+            self.connect_btn.setEnabled(False)
+            self.disconnect_btn.setEnabled(True)
+            for status in self.motor_status:
+                status.setStyleSheet("QLabel { color: orange; font-size: 24px; padding: 5px; }")
+        else:
             self.showConnectionError()
 
     def showConnectionError(self):
@@ -812,46 +1035,22 @@ class MotorControlTab(QWidget):
         layout.addLayout(com_group)
 
     def updateComPorts(self):
+        # Port enumeration runs on the hotplug watcher thread, the list
+        # arrives through setComPorts
+        if self.connection is not None:
+            self.connection.watcher.refresh()
+        
+    def setComPorts(self, ports):
+        current = self.com_box.currentText()
         self.com_box.clear()
-        ports = [port.device for port in serial.tools.list_ports.comports()]
         self.com_box.addItems(ports)
-
-    def generateTestData(self):
-        t = time.time()
-        # Create smooth oscillating patterns
-        data = {
-            'position': {
-                'M1': 125 + 25 * np.sin(t * 0.5),      # Oscillate between 100-150
-                'M2': 195 + 25 * np.sin(t * 0.5 + 2),  # Oscillate between 170-220
-                'M3': 260 + 25 * np.sin(t * 0.5 + 4)   # Oscillate between 235-285
-            },
-            'speed': {
-                'M1': 60 + 20 * np.sin(t * 0.3),       # Oscillate between 40-80
-                'M2': 60 + 20 * np.sin(t * 0.3 + 2),
-                'M3': 60 + 20 * np.sin(t * 0.3 + 4)
-            },
-            'torque': {
-                'M1': 50 + 10 * np.sin(t * 0.2),       # Oscillate between 40-60
-                'M2': 50 + 10 * np.sin(t * 0.2 + 2),
-                'M3': 50 + 10 * np.sin(t * 0.2 + 4)
-            },
-            'temp': {
-                'M1': 45 + 2 * np.sin(t * 0.1),        # Oscillate between 43-47
-                'M2': 45 + 2 * np.sin(t * 0.1 + 2),
-                'M3': 45 + 2 * np.sin(t * 0.1 + 4)
-            },
-            'voltage': {
-                'M1': 12 + 0.5 * np.sin(t * 0.15),     # Oscillate between 11.5-12.5
-                'M2': 12 + 0.5 * np.sin(t * 0.15 + 2),
-                'M3': 12 + 0.5 * np.sin(t * 0.15 + 4)
-            }
-        }
-        return data
+        if current in ports:
+            self.com_box.setCurrentText(current)
 
     def setupValueDisplays(self, layout):
         # Add real-time value displays with compact spacing
         self.value_displays = {}
-        display_titles = ['Current Position', 'Current Speed', 'Current Torque', 'Current Temperature', 'Current Voltage']
+        display_titles = list(VALUE_CHANNELS)
         
         for row, title in enumerate(display_titles):
             label = QLabel(title)
@@ -863,18 +1062,65 @@ class MotorControlTab(QWidget):
             for col in range(3):
                 display = QLabel("0.00")
                 display.setStyleSheet(self.getValueLabelStyle())
-                display.setFixedWidth(80)  # Fixed width for value displays
+                display.setMinimumWidth(80)  # Grows to fit the statistics line
                 layout.addWidget(display, row+4, col+1)
                 self.value_displays[title].append(display)
+        
+        # Window and figure for the statistics line under each value
+        row = len(display_titles) + 4
+        label = QLabel("Statistics")
+        label.setStyleSheet(f"color: {STYLES['TEXT']}; font-weight: bold; font-size: 11px;")
+        layout.addWidget(label, row, 0)
+        self.stats_window_box = QComboBox()
+        self.stats_window_box.addItems(list(STATS_OPTIONS))
+        self.stats_window_box.setCurrentText('10 s')
+        layout.addWidget(self.stats_window_box, row, 1)
+        self.stats_display_box = QComboBox()
+        self.stats_display_box.addItems(STATS_DISPLAY)
+        layout.addWidget(self.stats_display_box, row, 2, 1, 2)
 
-    def updateValueDisplays(self, test_data):
-        # Update real-time displays
-        for i, motor in enumerate(['M1', 'M2', 'M3']):
-            self.value_displays['Current Position'][i].setText(f"{test_data['position'][motor]:.2f}°")
-            self.value_displays['Current Speed'][i].setText(f"{test_data['speed'][motor]:.2f} rpm")
-            self.value_displays['Current Torque'][i].setText(f"{test_data['torque'][motor]:.2f}%")
-            self.value_displays['Current Temperature'][i].setText(f"{test_data['temp'][motor]:.2f}°C")
-            self.value_displays['Current Voltage'][i].setText(f"{test_data['voltage'][motor]:.2f}V")
+    def valueStats(self):
+        # Rolling statistics of the motor channels for the selected window,
+        # maintained by the store, so nothing is rescanned per frame
+        if self.store is None:
+            return None
+        try:
+            return self.store.stats(STATS_OPTIONS[self.stats_window_box.currentText()],
+                                    channels=[f"{prefix}{i+1}" for _, prefix, _ in VALUE_CHANNELS.values()
+                                              for i in range(3)])
+        except (KeyError, ValueError) as e:
+            print(f"Warning: no rolling statistics: {e}")
+            return None
+
+    def updateValueDisplays(self, test_data, stats=None):
+        # Update real-time displays, with the rolling statistics underneath
+        shown = self.stats_display_box.currentText()
+        for k, (title, (data_type, _, unit)) in enumerate(VALUE_CHANNELS.items()):
+            for i, motor in enumerate(['M1', 'M2', 'M3']):
+                display = self.value_displays[title][i]
+                text = formatValue(test_data[data_type][motor], unit)
+                if stats is None:
+                    display.setText(text)
+                    display.setToolTip("")
+                    continue
+                figures = {name: values[3 * k + i] for name, values in stats.items()}
+                if shown == 'Mean ± SD':
+                    line = f"{formatValue(figures['mean'], '')} ± {formatValue(figures['std'], '')}"
+                elif shown == 'RMS':
+                    line = formatValue(figures['rms'], unit)
+                elif shown == 'Min / Max':
+                    line = f"{formatValue(figures['min'], '')} / {formatValue(figures['max'], '')}"
+                else:
+                    line = formatValue(figures['ptp'], unit)
+                display.setText(f"{text}<br><span style='font-size: 9px; color: gray;'>{line}</span>")
+                display.setToolTip(
+                    f"{self.stats_window_box.currentText()}, {int(figures['count'])} samples\n"
+                    f"Mean {formatValue(figures['mean'], unit)}\n"
+                    f"RMS {formatValue(figures['rms'], unit)}\n"
+                    f"SD {formatValue(figures['std'], unit)}\n"
+                    f"Min {formatValue(figures['min'], unit)}\n"
+                    f"Max {formatValue(figures['max'], unit)}\n"
+                    f"Peak-to-peak {formatValue(figures['ptp'], unit)}")
 
     def getValueLabelStyle(self):
         return f"""
@@ -902,8 +1148,141 @@ class MotorControlTab(QWidget):
         
         layout.addLayout(gauge_layout)
 
+class SpectrumTab(QWidget):
+    def __init__(self, store, executor):
+        super().__init__()
+        import pyqtgraph as pg
+        self.layout = QVBoxLayout(self)
+        self.store = store
+        self.executor = executor  # analysis.AnalysisExecutor, runs the FFTs off this thread
+        self.sample_rate = None
+        
+        self.channels = {'Pitch': 'pitch', 'Roll': 'roll', 'Yaw': 'yaw'}
+        for prefix, title in [('enc', 'Position'), ('speed', 'Speed'), 
+                              ('torque', 'Torque'), ('temp', 'Temperature'), 
+                              ('voltage', 'Voltage')]:
+            for i in range(1, 4):
+                self.channels[f"{title} Motor {i}"] = f"{prefix}{i}"
+        for i in range(1, 4):
+            if f"enc{i}_rpm" in store.index:
+                self.channels[f"Encoder Speed Motor {i}"] = f"enc{i}_rpm"
+        
+        self.channel_box = QComboBox()
+        self.channel_box.addItems(self.channels.keys())
+        channel_layout = QHBoxLayout()
+        channel_layout.addWidget(QLabel("Channel"))
+        channel_layout.addWidget(self.channel_box)
+        channel_layout.addStretch()
+        self.layout.addLayout(channel_layout)
+        
+        self.plot = pg.PlotWidget(title="Spectrum")
+        self.plot.setBackground('w')
+        self.plot.showGrid(x=True, y=True, alpha=0.3)
+        self.plot.setLabel('bottom', 'Frequency', 'Hz')
+        self.plot.setLabel('left', 'Magnitude')
+        self.curve = self.plot.plot([], [], pen=STYLES['MOTOR1_COLOR'])
+        self.layout.addWidget(self.plot)
+        
+        self.spectrogram_plot = pg.PlotWidget(title=f"Spectrogram (last {SPECTROGRAM_SECONDS} s)")
+        self.spectrogram_plot.setBackground('w')
+        self.spectrogram_plot.setLabel('bottom', 'Time', 's')
+        self.spectrogram_plot.setLabel('left', 'Frequency', 'Hz')
+        self.spectrogram = pg.ImageItem()
+        self.spectrogram.setColorMap(pg.colormap.get('viridis'))
+        self.spectrogram_plot.addItem(self.spectrogram)
+        self.layout.addWidget(self.spectrogram_plot)
+        
+        # Magnitude history of the frequencies tracked on this channel (see
+        # tone_tracker.ToneStage), only shown when there are any
+        self.tracked_plot = pg.PlotWidget(title=f"Tracked frequencies (last {SPECTROGRAM_SECONDS} s)")
+        self.tracked_plot.setBackground('w')
+        self.tracked_plot.showGrid(x=True, y=True, alpha=0.3)
+        self.tracked_plot.setLabel('bottom', 'Time', 's')
+        self.tracked_plot.setLabel('left', 'Magnitude')
+        self.tracked_plot.addLegend()
+        self.tracked_curves = {}
+        self.layout.addWidget(self.tracked_plot)
+        
+        self.channel_box.currentTextChanged.connect(self.channelChanged)
+        self.channelChanged()
+        
+    def channelChanged(self):
+        # Results still in flight belong to the previous channel
+        self.executor.cancel('spectrum')
+        self.executor.cancel('spectrogram')
+        self.curve.setData([], [])
+        self.spectrogram.clear()
+        
+        import re
+        channel = self.channels[self.channel_box.currentText()]
+        pattern = re.compile(re.escape(channel) + r'_([0-9.e+-]+)hz$')
+        tracked = [(name, float(match.group(1))) for name in self.store.channels
+                   for match in [pattern.match(name)] if match]
+        self.tracked_plot.clear()
+        self.tracked_curves = {}
+        colors = [STYLES['MOTOR1_COLOR'], STYLES['MOTOR2_COLOR'], STYLES['MOTOR3_COLOR']]
+        for i, (name, frequency) in enumerate(sorted(tracked, key=lambda item: item[1])):
+            self.tracked_curves[name] = self.tracked_plot.plot(
+                [], [], pen=colors[i % len(colors)], name=f"{frequency:g} Hz")
+        self.tracked_plot.setVisible(bool(tracked))
+        
+    def updateRate(self, rate):
+        # Only follow the measured sample rate when it moves by more than
+        # 10%, so the workers can keep their filters and windows
+        if self.sample_rate is None or abs(self.sample_rate - rate) > 0.1 * rate:
+            self.sample_rate = rate
+            
+    def render_data(self, scheduler=None):
+        import numpy as np
+        from resampling import resample, estimate_rate
+        from analysis import spectrum, spectrogram
+        channel = self.channels[self.channel_box.currentText()]
+        times, values = self.store.channel(channel, n=4 * SPECTRUM_SIZE)
+        rate = estimate_rate(times)
+        if rate is None:
+            return
+        self.updateRate(rate)
+        
+        # The FFT assumes evenly spaced samples, so resample the jittery
+        # arrival times onto a uniform grid first
+        size = SPECTRUM_SIZE
+        _, uniform = resample(times, values, self.sample_rate,
+                              start=times[-1] - (size - 1) / self.sample_rate)
+        if len(uniform) >= size and not np.isnan(uniform[-size:]).any():
+            self.executor.submit('spectrum', spectrum, uniform[-size:], self.showSpectrum,
+                                 sample_rate=self.sample_rate)
+        
+        times, values = self.store.channel(channel, n=int(SPECTROGRAM_SECONDS * rate * 1.5))
+        _, uniform = resample(times, values, self.sample_rate,
+                              start=times[-1] - SPECTROGRAM_SECONDS)
+        if len(uniform) >= size and np.isfinite(uniform).any():
+            self.executor.submit('spectrogram', spectrogram, uniform, self.showSpectrogram,
+                                 sample_rate=self.sample_rate, segment=size // 2,
+                                 overlap=3 * size // 8)
+        
+        if self.tracked_curves and (scheduler is None or scheduler.should_repaint_gauges()):
+            times, rows = self.store.last(int(SPECTROGRAM_SECONDS * rate))
+            for name, curve in self.tracked_curves.items():
+                curve.setData(times - times[-1], rows[:, self.store.index[name]], connect='finite')
+            
+    def showSpectrum(self, result):
+        frequencies, magnitude = result
+        self.curve.setData(frequencies, magnitude)
+        
+    def showSpectrogram(self, result):
+        from PyQt5.QtCore import QRectF
+        frequencies, times, power = result
+        if len(times) == 0:
+            return
+        self.spectrogram.setImage(power.T, autoLevels=True)
+        self.spectrogram.setRect(QRectF(times[0] - SPECTROGRAM_SECONDS, frequencies[0],
+                                        times[-1] - times[0] or 1, frequencies[-1] - frequencies[0]))
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, target_fps=30, devices=(), fusion='madgwick', control_rate=500,
+                 shared_memory='motor_telemetry', serve=None, serve_unix=None,
+                 analysis_workers=None, alarm_rules=None, alarm_log='alarm_events.csv',
+                 tracking=(), tracking_window=256, velocity_window=9):
         super().__init__()
 
         # Set window icon
@@ -918,41 +1297,257 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
         
-        # Create tab widget
+        # Create tab widget, the tabs themselves are built once the window is visible
         self.tab_widget = QTabWidget()
+        self.loading_label = QLabel("Loading...")
+        self.loading_label.setAlignment(Qt.AlignCenter)
+        self.tab_widget.addTab(self.loading_label, "Motor Control")
+        main_layout.addWidget(self.tab_widget)
+        
+        self.tabs_loaded = False
+        self.target_fps = target_fps
+        self.extra_devices = list(devices)
+        self.fusion = fusion
+        self.control_rate = control_rate
+        self.shared_memory = shared_memory
+        self.serve = serve            # (host, port) for the telemetry server
+        self.serve_unix = serve_unix  # Unix socket path for the telemetry server
+        self.analysis_workers = analysis_workers
+        self.alarm_rules = alarm_rules  # alarms.Rule list, None for the defaults
+        self.alarm_log = alarm_log
+        self.tracking = list(tracking)  # (channels, frequencies) for sliding DFT tracking
+        self.tracking_window = tracking_window
+        self.velocity_window = velocity_window  # Encoder velocity fit, 0 to disable
+        self.startup_metrics = {}
+        
+        # Add stop flag
+        self.stopped = False
+        
+    def showEvent(self, event):
+        super().showEvent(event)
+        if 'window_shown' not in self.startup_metrics:
+            self.startup_metrics['window_shown'] = startupElapsed()
+            QTimer.singleShot(0, self.loadTabs)
+            
+    def loadTabs(self):
+        if self.tabs_loaded:
+            return
+        self.tabs_loaded = True
+        
+        # All serial devices are read by one asyncio loop on a background
+        # thread, which feeds the shared telemetry store
+        from telemetry import TelemetryStore
+        from acquisition import AcquisitionManager, SIMULATED
+        from sensor_interface import GyroSensor, FRAME_FIELDS
+        stages = []
+        if self.velocity_window:
+            # Continuous encoder position and velocity, before stages that may use them
+            from encoder import EncoderStage
+            stages.append(EncoderStage(window=self.velocity_window))
+        if self.fusion is not None:
+            from fusion import FusionStage, FILTERS
+            stages.append(FusionStage(FILTERS[self.fusion]()))
+        if self.tracking:
+            from tone_tracker import ToneStage
+            stages.extend(ToneStage(channels, frequencies, self.tracking_window)
+                          for channels, frequencies in self.tracking)
+        self.store = TelemetryStore(FRAME_FIELDS + [name for stage in stages for name in stage.outputs]
+                                    + [SIMULATED])
+        self.read_seq = 0
+        
+        # Mirror the store into shared memory for other local processes
+        self.publisher = None
+        if self.shared_memory:
+            from shared_telemetry import SharedTelemetryPublisher
+            try:
+                self.publisher = SharedTelemetryPublisher(self.store, self.shared_memory)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not publish telemetry to shared memory: {e}")
+        
+        # Optional network stream for dashboards and loggers
+        self.server = None
+        if self.serve is not None or self.serve_unix is not None:
+            from telemetry_server import TelemetryServer
+            host, port = self.serve if self.serve is not None else (None, None)
+            try:
+                self.server = TelemetryServer(self.store, host, port, self.serve_unix)
+                self.server.start()
+            except OSError as e:
+                self.server = None
+                print(f"Warning: Could not start telemetry server: {e}")
+        self.connection_signals = ConnectionSignals()
+        self.acquisition = AcquisitionManager(
+            self.store,
+            on_state=self.connection_signals.stateChanged.emit,
+            on_ports=self.connection_signals.portsChanged.emit,
+            stages=stages
+        )
+        # Synthetic frames are only shown while no port is open at all
+        self.simulator = GyroSensor(open_port=False)
+        
+        # Position loops run on their own fixed-rate thread while a motor is engaged
+        from control import ControlEngine
+        self.controller = ControlEngine(self.store, self.acquisition.send, rate=self.control_rate,
+                                        feedback_time=self.acquisition.channel_time)
+        
+        # Limit monitoring runs on every incoming block and can cut torque
+        # before the GUI even sees the data
+        from alarms import AlarmEngine, DEFAULT_RULES
+        self.alarms = AlarmEngine(self.store,
+                                  DEFAULT_RULES if self.alarm_rules is None else self.alarm_rules,
+                                  trip=self.tripMotor, log_path=self.alarm_log)
         
         # Create tabs
-        self.motor_control_tab = MotorControlTab()
-        self.artificial_horizon_tab = ArtificialHorizonTab()
+        self.motor_control_tab = MotorControlTab(self.acquisition, self.controller, self.store)
+        self.artificial_horizon_tab = ArtificialHorizonTab(self.store.channels)
         self.encoder_tab = EncoderTab()
+        from analysis import AnalysisExecutor
+        self.analysis = AnalysisExecutor(self.analysis_workers)
+        self.spectrum_tab = SpectrumTab(self.store, self.analysis)
+        
+        self.connection_signals.stateChanged.connect(self.setConnectionState)
+        self.connection_signals.portsChanged.connect(self.motor_control_tab.setComPorts)
+        self.acquisition.start_watching()
+        self.acquisition.connect('COM3')
+        for device in self.extra_devices:
+            try:
+                self.acquisition.add_device(device)
+            except ValueError as e:
+                print(f"Error adding device: {e}")
         
         # Add tabs
+        self.tab_widget.removeTab(0)
+        self.loading_label.deleteLater()
         self.tab_widget.addTab(self.motor_control_tab, "Motor Control")
         self.tab_widget.addTab(self.artificial_horizon_tab, "Artificial Horizon")
         self.tab_widget.addTab(self.encoder_tab, "Encoder Display")
-        
-        main_layout.addWidget(self.tab_widget)
-        
-        # Initialize sensor and timer
-        self.sensor = GyroSensor()
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_all_data)
-        self.timer.start(50)
-        
-        # Add stop flag
-        self.stopped = False
-        
-    def update_all_data(self):
+        self.tab_widget.addTab(self.spectrum_tab, "Spectrum")
+        
+        # Acquisition runs at the sample rate, rendering at its own target FPS
+        self.scheduler = FrameScheduler(self.target_fps)
+        self.acquisition_timer = QTimer()
+        self.acquisition_timer.timeout.connect(self.acquire_all_data)
+        self.acquisition_timer.start(ACQUISITION_INTERVAL_MS)
+        
+        self.render_timer = QTimer()
+        self.render_timer.setTimerType(Qt.PreciseTimer)  # Late ticks measure paint lag
+        self.render_timer.timeout.connect(self.render_all_data)
+        self.render_timer.start(int(1000 / self.scheduler.target_fps))
+        
+        # Periodically show render statistics in the status bar
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.showRenderStats)
+        self.stats_timer.start(1000)
+        
+        self.startup_metrics['ui_ready'] = startupElapsed()
+        print(f"Startup: window shown after {self.startup_metrics['window_shown']:.3f}s, "
+              f"UI ready after {self.startup_metrics['ui_ready']:.3f}s")
+        
+    def setConnectionState(self, name, state):
+        if state == 'connected' and 'sensor_ready' not in self.startup_metrics:
+            self.startup_metrics['sensor_ready'] = startupElapsed()
+        # The port selector drives the 'main' device, others show in the status bar
+        if name == 'main':
+            self.motor_control_tab.setConnectionState(state)
+        
+    def closeEvent(self, event):
+        if hasattr(self, 'controller'):
+            self.controller.stop()
+        if hasattr(self, 'acquisition'):
+            self.acquisition.stop()
+        if hasattr(self, 'alarms'):
+            self.alarms.close()
+        if getattr(self, 'publisher', None) is not None:
+            self.publisher.close()
+        if getattr(self, 'server', None) is not None:
+            self.server.stop()
+        if hasattr(self, 'analysis'):
+            self.analysis.shutdown()
+        super().closeEvent(event)
+        
+    def setTargetFps(self, fps):
+        self.scheduler.set_target_fps(fps)
+        self.render_timer.setInterval(int(1000 / self.scheduler.target_fps))
+        
+    def acquire_all_data(self):
         if not self.stopped:
             try:
-                self.motor_control_tab.update_data()
-                self.artificial_horizon_tab.update_data()
-                self.encoder_tab.update_data()
+                if self.acquisition.idle():
+                    self.acquisition.simulate(self.simulator.generate_test_frame())
+                # Results of background analysis are applied on this thread
+                self.analysis.drain()
+                self.read_seq, times, rows = self.store.since(self.read_seq)
+                
+                self.motor_control_tab.acquire_data(times, rows)
+                self.artificial_horizon_tab.acquire_data(times, rows)
+                self.encoder_tab.acquire_data(times, rows)
             except Exception as e:
-                print(f"Error in main update loop: {e}")
+                print(f"Error in acquisition loop: {e}")
+                
+    def render_all_data(self):
+        if self.stopped or not self.scheduler.should_render():
+            return
+        self.scheduler.begin_frame()
+        try:
+            # Only the visible tab needs repainting
+            current = self.tab_widget.currentWidget()
+            if hasattr(current, 'render_data'):
+                current.render_data(self.scheduler)
+        except Exception as e:
+            print(f"Error in render loop: {e}")
+        finally:
+            self.scheduler.end_frame()
+            
+    def renderStats(self):
+        return self.scheduler.stats()
+        
+    def showRenderStats(self):
+        stats = self.renderStats()
+        self.statusBar().showMessage(
+            f"Render: {stats['avg_frame_ms']:.1f} ms/frame (lag {stats['avg_lag_ms']:.1f} ms), "
+            f"skipped {stats['frames_skipped']}/{stats['frames_rendered'] + stats['frames_skipped']}, "
+            f"quality level {stats['level']}"
+            + self.controlSummary()
+            + self.alarmSummary()
+            + self.serverSummary()
+            + self.deviceSummary()
+        )
+        
+    def controlSummary(self):
+        if not self.controller.running():
+            return " | Control: idle"
+        stats = self.controller.stats()
+        return (f" | Control: {stats['rate']:.0f} Hz, jitter {stats['jitter_mean_us']:.0f}"
+                f"/{stats['jitter_max_us']:.0f} us (mean/max), overruns {stats['overruns']}")
+        
+    def alarmSummary(self):
+        active = self.alarms.active_rules()
+        if active:
+            return f" | ALARM: {', '.join(active)}"
+        stats = self.alarms.stats()
+        return f" | Alarms: {stats['events']} events, {stats['trips']} trips" if stats['events'] else ""
+        
+    def tripMotor(self, motor):
+        # Alarm action, runs on the acquisition thread: leave closed-loop
+        # control first so the loop cannot re-apply effort, then cut torque
+        self.controller.release(motor - 1)
+        self.acquisition.send('torque_off', motor)
+        
+    def serverSummary(self):
+        if self.server is None:
+            return ""
+        stats = self.server.stats()
+        return f" | Stream: {stats['clients']} clients, {stats['dropped']} dropped"
+        
+    def deviceSummary(self):
+        devices = self.acquisition.stats()
+        if len(devices) <= 1:
+            return ""
+        return " | " + ", ".join(f"{name}: {info['state']}" for name, info in devices.items())
 
     def stopApplication(self):
         self.stopped = True
+        self.controller.release()
         # Reset all tabs to zero
         self.motor_control_tab.setHome()
         self.artificial_horizon_tab.update_data()  # Will use zero values
@@ -960,10 +1555,58 @@ class MainWindow(QMainWindow):
 
 # Add this at the end of the file
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    import argparse
+    import multiprocessing
+    multiprocessing.freeze_support()  # Analysis workers in frozen Windows builds
+    parser = argparse.ArgumentParser(description="Motor control and gyro monitoring")
+    parser.add_argument('--device', action='append', default=[],
+                        help="extra serial device as name=PORT[@baud][:field,...]")
+    parser.add_argument('--fps', type=int, default=30, help="target render rate")
+    parser.add_argument('--fusion', choices=['madgwick', 'mahony', 'complementary', 'none'],
+                        default='madgwick', help="orientation filter for raw gyro/accel data")
+    parser.add_argument('--control-rate', type=float, default=500,
+                        help="position control loop rate in Hz (500-1000 recommended)")
+    parser.add_argument('--shared-memory', default='motor_telemetry', metavar='NAME',
+                        help="shared memory name for local telemetry readers ('none' to disable)")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="stream telemetry to TCP/WebSocket subscribers")
+    parser.add_argument('--serve-unix', metavar='PATH',
+                        help="stream telemetry to subscribers on a Unix socket")
+    parser.add_argument('--analysis-workers', type=int,
+                        help="processes for spectrum analysis (0 runs it in the GUI thread)")
+    parser.add_argument('--velocity-window', type=int, default=9,
+                        help="samples in the encoder velocity fit (0 disables encoder unwrapping)")
+    parser.add_argument('--track', action='append', default=[], metavar='CHANNEL:FREQ',
+                        help="track frequencies with a sliding DFT, e.g. speed1,speed2:12.5,25")
+    parser.add_argument('--track-window', type=int, default=256,
+                        help="samples in each tracked frequency's window")
+    parser.add_argument('--alarms', metavar='FILE',
+                        help="JSON alarm rules instead of the defaults ('none' to disable)")
+    parser.add_argument('--alarm-log', default='alarm_events.csv', metavar='FILE',
+                        help="CSV file alarm events are appended to ('none' to disable)")
+    args, qt_args = parser.parse_known_args()
+    
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyle(QStyleFactory.create('Fusion'))
     
-    window = MainWindow()
+    from acquisition import parse_device_spec
+    from telemetry_server import parse_address
+    from alarms import load_rules
+    from tone_tracker import parse_track_spec
+    window = MainWindow(target_fps=args.fps, 
+                        devices=[parse_device_spec(spec) for spec in args.device],
+                        fusion=None if args.fusion == 'none' else args.fusion,
+                        control_rate=args.control_rate,
+                        shared_memory=None if args.shared_memory == 'none' else args.shared_memory,
+                        serve=parse_address(args.serve) if args.serve else None,
+                        serve_unix=args.serve_unix,
+                        analysis_workers=args.analysis_workers,
+                        alarm_rules=None if args.alarms is None else
+                        [] if args.alarms == 'none' else load_rules(args.alarms),
+                        alarm_log=None if args.alarm_log == 'none' else args.alarm_log,
+                        tracking=[parse_track_spec(spec) for spec in args.track],
+                        tracking_window=args.track_window,
+                        velocity_window=args.velocity_window)
     window.show()
     
     sys.exit(app.exec_())
@@ -0,0 +1,109 @@
+import time
+
+class FrameScheduler:
+    # Degrades plot quality when frames overrun their budget. A frame's cost
+    # is the Python render time between begin_frame and end_frame. The event
+    # loop lag seen at the next tick is reported on its own: pyqtgraph paints
+    # after render_data returns, so the paint (and anything else blocking the
+    # GUI thread) shows up as a late timer, and the part of it the frame's
+    # own overrun does not explain is paid back by skipping frames.
+    def __init__(self, target_fps=30, max_level=3, recover_frames=30):
+        self.max_level = max_level
+        self.recover_frames = recover_frames
+        self.set_target_fps(target_fps)
+        self.reset_stats()
+
+    def set_target_fps(self, fps):
+        self.target_fps = max(1, int(fps))
+        self.frame_budget = 1.0 / self.target_fps
+
+    def reset_stats(self):
+        self.level = 0  # Degrade level, 0 = full quality
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.overruns = 0
+        self.last_frame_time = 0.0
+        self.avg_frame_time = 0.0
+        self.max_frame_time = 0.0
+        self.last_lag = 0.0
+        self.avg_lag = 0.0
+        self.max_lag = 0.0
+        self._last_tick = None
+        self._debt = 0.0
+        self._overrun = 0.0  # Last frame's render time over budget, already in _debt
+        self._good_frames = 0
+        self._frame_start = None
+
+    def should_render(self):
+        # Called on every timer tick; how late it came is the lag
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            self.last_lag = max(0.0, now - self._last_tick - self.frame_budget)
+            self.avg_lag = 0.9 * self.avg_lag + 0.1 * self.last_lag
+            self.max_lag = max(self.max_lag, self.last_lag)
+            # Lag the last frame's own overrun does not explain, beyond timer jitter
+            unexplained = self.last_lag - self._overrun
+            if unexplained > 0.5 * self.frame_budget:
+                self._debt = min(self._debt + unexplained, 1.0)
+        self._overrun = 0.0
+        self._last_tick = now
+        # Pay back time spent by overrunning frames by skipping whole frames
+        if self._debt > 0:
+            self._debt = max(0.0, self._debt - self.frame_budget)
+            self.frames_skipped += 1
+            return False
+        return True
+
+    def begin_frame(self):
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if self._frame_start is None:
+            return
+        elapsed = time.perf_counter() - self._frame_start
+        self._frame_start = None
+
+        self.frames_rendered += 1
+        self.last_frame_time = elapsed
+        self.max_frame_time = max(self.max_frame_time, elapsed)
+        self.avg_frame_time = 0.9 * self.avg_frame_time + 0.1 * elapsed
+
+        if elapsed > self.frame_budget:
+            self.overruns += 1
+            self._overrun = elapsed - self.frame_budget
+            self._debt = min(self._debt + self._overrun, 1.0)
+            self._good_frames = 0
+            self.level = min(self.level + 1, self.max_level)
+        else:
+            self._good_frames += 1
+            # Only restore quality once frames are comfortably within budget
+            if (self.level > 0 and self._good_frames >= self.recover_frames
+                    and self.avg_frame_time < 0.5 * self.frame_budget):
+                self.level -= 1
+                self._good_frames = 0
+
+    def point_budget(self, full_points, min_points=16):
+        return max(min_points, int(full_points) >> self.level)
+
+    def gauge_interval(self):
+        # Repaint gauges every N rendered frames
+        return 1 << self.level
+
+    def should_repaint_gauges(self):
+        return self.frames_rendered % self.gauge_interval() == 0
+
+    def stats(self):
+        total = self.frames_rendered + self.frames_skipped
+        return {
+            'target_fps': self.target_fps,
+            'frames_rendered': self.frames_rendered,
+            'frames_skipped': self.frames_skipped,
+            'skip_ratio': self.frames_skipped / total if total else 0.0,
+            'overruns': self.overruns,
+            'level': self.level,
+            'last_frame_ms': self.last_frame_time * 1000,
+            'avg_frame_ms': self.avg_frame_time * 1000,
+            'max_frame_ms': self.max_frame_time * 1000,
+            'avg_lag_ms': self.avg_lag * 1000,
+            'max_lag_ms': self.max_lag * 1000
+        }
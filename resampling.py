@@ -0,0 +1,76 @@
+import numpy as np
+
+def estimate_rate(times):
+    # Nominal sample rate from the median spacing of increasing timestamps
+    intervals = np.diff(np.asarray(times, dtype=float))
+    intervals = intervals[intervals > 0]
+    if len(intervals) == 0:
+        return None
+    return 1.0 / np.median(intervals)
+
+def _slopes(times, values):
+    # Finite-difference derivative at every sample: central inside, one-sided
+    # at the ends. Used as Hermite tangents for cubic interpolation; tangents
+    # next to gap markers are flattened to zero.
+    slopes = np.empty_like(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes[1:-1] = ((values[2:] - values[:-2]) /
+                        (times[2:] - times[:-2])[:, None])
+        slopes[0] = (values[1] - values[0]) / (times[1] - times[0])
+        slopes[-1] = (values[-1] - values[-2]) / (times[-1] - times[-2])
+    slopes[~np.isfinite(slopes)] = 0.0
+    return slopes
+
+def resample(times, values, rate, start=None, stop=None, method='linear', max_gap=None):
+    # Interpolate jittery samples onto a uniform grid of the given rate.
+    # values may be 1-D or (samples, channels). Grid points that fall into a
+    # gap (spacing above max_gap, or a NaN gap marker) come out as NaN rather
+    # than being bridged. Returns (grid_times, grid_values).
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+
+    if len(times) < 2:
+        empty = np.empty((0, values.shape[1]))
+        return np.empty(0), empty[:, 0] if squeeze else empty
+
+    if max_gap is None:
+        # Anything well beyond the usual spacing is treated as missing data
+        rate_estimate = estimate_rate(times)
+        max_gap = 5.0 / rate_estimate if rate_estimate else np.inf
+    start = times[0] if start is None else max(start, times[0])
+    stop = times[-1] if stop is None else min(stop, times[-1])
+    count = int(np.floor((stop - start) * rate + 1e-9)) + 1 if stop >= start else 0
+    grid = start + np.arange(count) / rate
+
+    i = np.clip(np.searchsorted(times, grid, side='right') - 1, 0, len(times) - 2)
+    t0 = times[i]
+    dt = times[i + 1] - t0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        u = np.where(dt > 0, (grid - t0) / dt, 0.0)
+    u = np.clip(u, 0.0, 1.0)[:, None]
+
+    v0 = values[i]
+    v1 = values[i + 1]
+    result = v0 + (v1 - v0) * u
+
+    if method == 'cubic':
+        # Cubic Hermite segments with finite-difference tangents
+        slopes = _slopes(times, values)
+        h = dt[:, None]
+        u2 = u * u
+        u3 = u2 * u
+        cubic = ((2 * u3 - 3 * u2 + 1) * v0 + (u3 - 2 * u2 + u) * h * slopes[i] +
+                 (-2 * u3 + 3 * u2) * v1 + (u3 - u2) * h * slopes[i + 1])
+        result = np.where(np.isfinite(cubic), cubic, result)
+    elif method != 'linear':
+        raise ValueError(f"Unknown interpolation method '{method}'")
+
+    # Grid points on a sample take its value, even next to a gap; only the
+    # inside of a gap segment is missing
+    result = np.where(u == 0, v0, np.where(u == 1, v1, result))
+    inside = (u[:, 0] > 0) & (u[:, 0] < 1)
+    result[(dt > max_gap) & inside] = np.nan
+    return grid, result[:, 0] if squeeze else result
@@ -0,0 +1,137 @@
+import numpy as np
+
+# Streaming per-channel statistics. Samples are folded in block by block as
+# count/mean/M2 (Welford, merged with Chan's formula) plus min and max, so a
+# sample costs O(1) no matter how long the windows are. Windows are made of
+# fixed-duration buckets: a query merges the few buckets that cover the
+# window instead of rescanning the samples, and the window edge moves in
+# steps of one bucket (window / buckets).
+
+STAT_NAMES = ['count', 'mean', 'rms', 'std', 'min', 'max', 'ptp']
+
+def block_moments(rows):
+    # Per-column count, mean, M2, min, max of a (samples, channels) block,
+    # ignoring NaN gaps
+    finite = np.isfinite(rows)
+    count = finite.sum(axis=0).astype(float)
+    total = np.where(finite, rows, 0.0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, 0.0)
+    m2 = (np.where(finite, rows - mean, 0.0) ** 2).sum(axis=0)
+    return count, mean, m2, np.fmin.reduce(rows, axis=0), np.fmax.reduce(rows, axis=0)
+
+def merge(count, mean, m2, other_count, other_mean, other_m2):
+    # Chan et al. parallel combination of two sets of moments
+    total = count + other_count
+    delta = other_mean - mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(total > 0, other_count / total, 0.0)
+    return total, mean + delta * share, m2 + other_m2 + delta * delta * count * share
+
+def summarize(count, mean, m2, low, high):
+    empty = count == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = np.where(empty, np.nan, m2 / count)
+    mean = np.where(empty, np.nan, mean)
+    return {
+        'count': count,
+        'mean': mean,
+        'rms': np.sqrt(variance + mean * mean),
+        'std': np.sqrt(variance),
+        'min': low,
+        'max': high,
+        'ptp': high - low
+    }
+
+class Moments:
+    # Cumulative statistics since creation (or the last reset)
+    def __init__(self, channels):
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.count = np.zeros(self.channels)
+        self.mean = np.zeros(self.channels)
+        self.m2 = np.zeros(self.channels)
+        self.min = np.full(self.channels, np.nan)
+        self.max = np.full(self.channels, np.nan)
+
+    def add(self, count, mean, m2, low, high):
+        self.count, self.mean, self.m2 = merge(self.count, self.mean, self.m2, count, mean, m2)
+        self.min = np.fmin(self.min, low)
+        self.max = np.fmax(self.max, high)
+
+    def summary(self):
+        return summarize(self.count, self.mean, self.m2, self.min, self.max)
+
+class WindowStats:
+    # Statistics over roughly the last `seconds`, kept in buckets + 1 slots:
+    # the current partial bucket plus `buckets` complete ones
+    def __init__(self, channels, seconds, buckets=20):
+        self.seconds = seconds
+        self.width = seconds / buckets
+        self.slots = buckets + 1
+        self.slot = np.full(self.slots, np.iinfo(np.int64).min)  # Time slot held by each bucket
+        self.count = np.zeros((self.slots, channels))
+        self.mean = np.zeros((self.slots, channels))
+        self.m2 = np.zeros((self.slots, channels))
+        self.min = np.full((self.slots, channels), np.nan)
+        self.max = np.full((self.slots, channels), np.nan)
+        self.latest = None
+
+    def add(self, times, rows):
+        slots = np.floor(np.asarray(times) / self.width).astype(np.int64)
+        # Blocks rarely span more than one or two buckets
+        for slot in np.unique(slots):
+            i = slot % self.slots
+            if self.slot[i] != slot:
+                self.slot[i] = slot
+                self.count[i] = 0.0
+                self.mean[i] = 0.0
+                self.m2[i] = 0.0
+                self.min[i] = np.nan
+                self.max[i] = np.nan
+            count, mean, m2, low, high = block_moments(rows[slots == slot])
+            self.count[i], self.mean[i], self.m2[i] = merge(
+                self.count[i], self.mean[i], self.m2[i], count, mean, m2)
+            self.min[i] = np.fmin(self.min[i], low)
+            self.max[i] = np.fmax(self.max[i], high)
+        self.latest = slots[-1] if self.latest is None else max(self.latest, slots[-1])
+
+    def summary(self):
+        live = (self.latest is not None) & (self.slot > (self.latest or 0) - self.slots)
+        count = self.count[live].sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, (self.count[live] * self.mean[live]).sum(axis=0) / count, 0.0)
+        m2 = (self.m2[live] + self.count[live] * (self.mean[live] - mean) ** 2).sum(axis=0)
+        low = np.fmin.reduce(self.min[live], axis=0) if live.any() else self.min[0] * np.nan
+        high = np.fmax.reduce(self.max[live], axis=0) if live.any() else self.max[0] * np.nan
+        return summarize(count, mean, m2, low, high)
+
+class RollingStats:
+    # Session-wide statistics plus one WindowStats per configured window
+    def __init__(self, channels, windows=(1.0, 10.0, 60.0), buckets=20):
+        self.channels = channels
+        self.buckets = buckets
+        self.reset(windows)
+
+    def reset(self, windows=None):
+        windows = self.windows if windows is None else windows
+        self.session = Moments(self.channels)
+        self.windows = {seconds: WindowStats(self.channels, seconds, self.buckets)
+                        for seconds in windows}
+
+    def add(self, times, rows):
+        if len(times) == 0:
+            return
+        self.session.add(*block_moments(rows))
+        for window in self.windows.values():
+            window.add(times, rows)
+
+    def summary(self, seconds=None):
+        # Statistics for one of the configured windows, or the whole session
+        if seconds is None:
+            return self.session.summary()
+        if seconds not in self.windows:
+            raise ValueError(f"No {seconds} s statistics window, have {sorted(self.windows)}")
+        return self.windows[seconds].summary()
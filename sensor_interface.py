@@ -2,64 +2,163 @@ import serial
 import numpy as np
 import time
 
+# Comma separated fields of one line sent by the controller. Lines may end
+# after the encoder fields, missing motor fields are read as NaN.
+FRAME_FIELDS = [
+    'pitch', 'roll', 'yaw',
+    'enc1', 'enc2', 'enc3',
+    'speed1', 'speed2', 'speed3',
+    'torque1', 'torque2', 'torque3',
+    'temp1', 'temp2', 'temp3',
+    'voltage1', 'voltage2', 'voltage3',
+    'gx', 'gy', 'gz',  # Raw gyro, deg/s
+    'ax', 'ay', 'az'   # Raw accelerometer
+]
+
+# Commands to the motor controller, one line each: "<code>,<motor>,<value>"
+# with motors numbered from 1. 'effort' is the closed-loop output in % of
+# the torque limit, 'torque_off' releases the motor.
+COMMANDS = {
+    'torque_limit': 'T',
+    'position': 'P',
+    'velocity': 'V',
+    'effort': 'U',
+    'torque_off': 'X'
+}
+
+def format_command(command, motor, value=0.0):
+    return f"{COMMANDS[command]},{motor},{value:.3f}\n".encode()
+
+def gap_frame():
+    # Marks a stretch of missing data in the stream (e.g. a lost connection)
+    return (float('nan'),) * len(FRAME_FIELDS)
+
+def is_gap(frame):
+    return all(value != value for value in frame)
+
+def parse_line(raw_data, n_fields, min_fields=None):
+    # Parse one comma separated line into n_fields floats, padding missing
+    # trailing fields with NaN. Malformed lines return None.
+    try:
+        values = [float(v) for v in raw_data.decode().strip().split(',')]
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if len(values) < (n_fields if min_fields is None else min_fields):
+        return None
+    values = values[:n_fields]
+    return tuple(values) + (float('nan'),) * (n_fields - len(values))
+
 class GyroSensor:
-    def __init__(self, port='COM3', baud_rate=115200):
+    def __init__(self, port='COM3', baud_rate=115200, open_port=True):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.t = 0
+        self.connected = False
+        # Synthetic data is only produced if the port never opened, a dropped
+        # connection yields gap frames instead
+        self.simulated = True
+        if open_port:
+            self.connect()
+
+    def connect(self):
         try:
-            self.serial = serial.Serial(port, baud_rate, timeout=1)
+            self.serial = serial.Serial(self.port, self.baud_rate, timeout=1)
             self.connected = True
-            print(f"Successfully connected to {port}")
+            self.simulated = False
+            print(f"Successfully connected to {self.port}")
         except serial.SerialException as e:
-            print(f"Warning: Could not connect to port {port}: {str(e)}")
+            print(f"Warning: Could not connect to port {self.port}: {str(e)}")
             self.connected = False
-            self.t = 0
-            
+        return self.connected
+
     def read_angles(self):
         if self.connected:
             try:
                 data = self.serial.readline()
                 return self.parse_angles(data)
             except serial.SerialException:
-                return self.generate_test_angles()
-        else:
+                self.connection_lost()
+                return gap_frame()[:3]
+        elif self.simulated:
             return self.generate_test_angles()
-            
+        return gap_frame()[:3]
+
     def read_encoders(self):
         if self.connected:
             try:
                 data = self.serial.readline()
                 return self.parse_encoders(data)
             except serial.SerialException:
-                return self.generate_test_encoders()
-        else:
+                self.connection_lost()
+                return gap_frame()[3:6]
+        elif self.simulated:
             return self.generate_test_encoders()
-        
+        return gap_frame()[3:6]
+
+    def read_frame(self):
+        # Returns None when no complete line arrived before the read timeout
+        if self.connected:
+            try:
+                data = self.serial.readline()
+            except serial.SerialException:
+                self.connection_lost()
+                return gap_frame()
+            return self.parse_frame(data) if data else None
+        elif self.simulated:
+            return self.generate_test_frame()
+        return gap_frame()
+
     def parse_angles(self, raw_data):
         try:
             values = raw_data.decode().strip().split(',')
             return float(values[0]), float(values[1]), float(values[2])
         except:
             return 0.0, 0.0, 0.0
-            
+
     def parse_encoders(self, raw_data):
         try:
             values = raw_data.decode().strip().split(',')
             return float(values[3]), float(values[4]), float(values[5])
         except:
             return 0.0, 0.0, 0.0
-            
+
+    def parse_frame(self, raw_data):
+        # Malformed lines are dropped rather than reported as zeros
+        return parse_line(raw_data, len(FRAME_FIELDS), min_fields=6)
+
     def generate_test_angles(self):
         self.t += 0.01
         pitch = 45 * np.sin(2 * np.pi * 0.1 * self.t)
         roll = 30 * np.cos(2 * np.pi * 0.15 * self.t)
         yaw = (self.t * 10) % 360
         return pitch, roll, yaw
-        
+
     def generate_test_encoders(self):
         self.t += 0.01
         return ((self.t * 20) % 360,
                 (self.t * 15) % 360,
-                (self.t * 25) % 360) 
-        
+                (self.t * 25) % 360)
+
+    def generate_test_frame(self):
+        pitch, roll, yaw = self.generate_test_angles()
+        t = time.time()
+        # Smooth oscillating motor telemetry, phase shifted per motor
+        frame = [pitch, roll, yaw]
+        for offset, amplitude, rate in [(None, 25, 0.5),   # Encoder positions
+                                        (60, 20, 0.3),     # Speed, 40-80 rpm
+                                        (50, 10, 0.2),     # Torque, 40-60 %
+                                        (45, 2, 0.1),      # Temperature, 43-47 °C
+                                        (12, 0.5, 0.15)]:  # Voltage, 11.5-12.5 V
+            for i, base in enumerate([125, 195, 260]):
+                center = base if offset is None else offset
+                frame.append(center + amplitude * np.sin(t * rate + 2 * i))
+        # No raw IMU data in test frames
+        return tuple(float(v) for v in frame) + gap_frame()[len(frame):]
+
+    def connection_lost(self):
+        print(f"Lost connection to {self.port}")
+        self.disconnect()
+
     def disconnect(self):
         if self.connected and hasattr(self, 'serial'):
             try:
@@ -67,4 +166,4 @@ class GyroSensor:
             except:
                 pass
             self.connected = False
-            print("Disconnected from serial port") 
\ No newline at end of file
+            print("Disconnected from serial port")
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+
+class SessionLogger:
+    # Appends every new TelemetryStore row to a CSV log: a header line with
+    # "time" and the channel names, then one line per row (NaN for gaps).
+    # Call write_pending() periodically; rows are taken with store.since(),
+    # so nothing is lost as long as the store's ring outlasts the interval.
+    # With rotate_bytes set, a new numbered file is started once the current
+    # one grows past that size.
+    def __init__(self, store, path, channels=None, rotate_bytes=None):
+        self.store = store
+        self.path = path
+        self.channels = list(store.channels if channels is None else channels)
+        unknown = [name for name in self.channels if name not in store.index]
+        if unknown:
+            raise ValueError(f"Unknown channels: {unknown}")
+        self.columns = [store.index[name] for name in self.channels]
+        self.rotate_bytes = rotate_bytes
+        self.fmt = ['%.6f'] + ['%.6g'] * len(self.channels)
+        self.seq = store.count
+        self.rows = 0
+        self.files = []
+        self.file = None
+        self._open()
+
+    def _next_path(self):
+        if not self.files:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{len(self.files)}{ext}"
+
+    def _open(self):
+        if self.file is not None:
+            self.file.close()
+        path = self._next_path()
+        self.file = open(path, 'w', newline='')
+        self.file.write(','.join(['time'] + self.channels) + '\n')
+        self.files.append(path)
+
+    def write_pending(self):
+        next_seq, times, rows = self.store.since(self.seq)
+        skipped = next_seq - len(times) - self.seq  # Rows the ring dropped before we got to them
+        self.seq = next_seq
+        if len(times):
+            np.savetxt(self.file, np.column_stack([times, rows[:, self.columns]]),
+                       fmt=self.fmt, delimiter=',')
+            self.file.flush()
+            self.rows += len(times)
+            if self.rotate_bytes is not None and self.file.tell() >= self.rotate_bytes:
+                self._open()
+        return len(times), skipped
+
+    def bytes_written(self):
+        return sum(os.path.getsize(path) for path in self.files[:-1]) + self.file.tell()
+
+    def close(self):
+        self.write_pending()
+        self.file.close()
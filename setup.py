@@ -5,11 +5,24 @@ setup(
     version="1.0",
     description="FFT Gyro Application",
     author="Neel",
-    packages=[""],
+    py_modules=[
+        'main', 'headless', 'acquisition', 'alarms', 'analysis', 'batch_analysis',
+        'connection_manager', 'control', 'decimation', 'encoder', 'fft_processor', 'fusion',
+        'render_scheduler', 'resampling', 'rolling_stats', 'sensor_interface',
+        'session_log', 'shared_telemetry', 'telemetry', 'telemetry_server', 'tone_tracker',
+        'trajectory'
+    ],
     install_requires=[
         'PyQt5',
         'numpy',
         'pyqtgraph',
-        'pyserial'
+        'pyserial',
+        'scipy'
     ],
-) 
\ No newline at end of file
+    entry_points={
+        'console_scripts': [
+            'motor-logger = headless:main',
+            'motor-analyze = batch_analysis:main'
+        ]
+    },
+)
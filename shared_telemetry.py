@@ -0,0 +1,209 @@
+import json
+import os
+import struct
+import sys
+import numpy as np
+from multiprocessing import shared_memory
+
+# Publishes TelemetryStore rows into a shared memory ring so local scripts can
+# follow live data without touching the serial port. Layout:
+#
+#   header   magic, version, header size, channel count, capacity,
+#            write count (next sequence number), writer pid, open flag,
+#            schema length, then the schema as JSON (channel names)
+#   times    float64[capacity]            monotonic receive time per row
+#   data     float64[capacity, channels]  one value per channel, NaN for gaps
+#
+# Rows are written before the write count is advanced, so everything below
+# the count a reader sees is complete. The writer publishes at most
+# block_rows(capacity) rows at a time, so while a reader copies, only rows
+# within that many of being a full ring behind the count can be overwritten;
+# the reader re-reads the count afterwards and drops those. A reader that
+# falls more than a full ring behind skips ahead, like TelemetryStore.since().
+
+DEFAULT_NAME = 'motor_telemetry'
+MAGIC = b'MCTS'
+VERSION = 1
+HEADER_SIZE = 4096
+_HEADER = struct.Struct('<4sIIIQqQII')  # Up to and including the schema length
+_COUNT_OFFSET = 24
+_OPEN_OFFSET = 40
+MAX_BLOCK = 1024  # Rows written between two updates of the write count
+_published = set()  # Segments created by this process
+
+def block_rows(capacity):
+    return max(1, min(MAX_BLOCK, capacity // 2))
+
+def _layout(buffer, channels, capacity, offset=HEADER_SIZE):
+    times = np.ndarray((capacity,), np.float64, buffer, offset)
+    data = np.ndarray((capacity, channels), np.float64, buffer, offset + 8 * capacity)
+    count = np.ndarray((1,), np.int64, buffer, _COUNT_OFFSET)
+    return times, data, count
+
+class SharedTelemetryPublisher:
+    # Mirrors every block appended to a TelemetryStore into shared memory.
+    # Runs as a store listener on the writer's (acquisition) thread.
+    def __init__(self, store, name=DEFAULT_NAME, capacity=None):
+        self.store = store
+        self.name = name
+        self.channels = list(store.channels)
+        self.capacity = store.capacity if capacity is None else capacity
+        self.block = block_rows(self.capacity)
+        schema = json.dumps({'channels': self.channels, 'clock': 'monotonic'}).encode()
+        if _HEADER.size + len(schema) > HEADER_SIZE:
+            raise ValueError("Telemetry schema does not fit the shared memory header")
+
+        size = HEADER_SIZE + 8 * self.capacity * (1 + len(self.channels))
+        self.shm = self._create(name, size)
+        _published.add(self.shm._name)
+        _HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, HEADER_SIZE, len(self.channels),
+                          self.capacity, 0, os.getpid(), 1, len(schema))
+        self.shm.buf[_HEADER.size:_HEADER.size + len(schema)] = schema
+        self.times, self.data, self.count = _layout(self.shm.buf, len(self.channels), self.capacity)
+        self.times[:] = np.nan
+        self.data[:] = np.nan
+        store.add_listener(self.publish)
+
+    @staticmethod
+    def _create(name, size):
+        try:
+            return shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # POSIX segments outlive a crashed writer; Windows frees them with
+            # the last handle, so an existing one there is always in use
+            if sys.platform == 'win32' or _writer_alive(name):
+                raise
+            print(f"Replacing stale shared telemetry segment '{name}'")
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            return shared_memory.SharedMemory(name, create=True, size=size)
+
+    def publish(self, times, rows):
+        n = len(times)
+        if n > self.capacity:
+            times, rows = times[-self.capacity:], rows[-self.capacity:]
+            self.count[0] += n - self.capacity
+            n = self.capacity
+        if n > self.block:
+            for i in range(0, n, self.block):
+                self._write(times[i:i + self.block], rows[i:i + self.block])
+        else:
+            self._write(times, rows)
+
+    def _write(self, times, rows):
+        n = len(times)
+        start = int(self.count[0]) % self.capacity
+        first = min(n, self.capacity - start)
+        self.times[start:start + first] = times[:first]
+        self.data[start:start + first] = rows[:first]
+        if first < n:
+            self.times[:n - first] = times[first:]
+            self.data[:n - first] = rows[first:]
+        self.count[0] += n  # Publish only after the rows are in place
+
+    def close(self):
+        self.store.remove_listener(self.publish)
+        struct.pack_into('<I', self.shm.buf, _OPEN_OFFSET, 0)
+        del self.times, self.data, self.count
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        _published.discard(self.shm._name)
+
+def _writer_alive(name):
+    try:
+        reader = SharedTelemetryReader(name)
+    except (ValueError, FileNotFoundError):
+        return False
+    pid = reader.writer_pid
+    reader.close()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class SharedTelemetryReader:
+    # Read-only view of a published ring with the same since()/latest()
+    # interface as TelemetryStore. Arrays are marked non-writeable.
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = shared_memory.SharedMemory(name)
+        if (sys.version_info < (3, 13) and sys.platform != 'win32'
+                and self.shm._name not in _published):
+            # Attaching must not make this process unlink the segment on exit
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        (magic, version, header_size, channels, capacity, _, self.writer_pid, _,
+         schema_size) = _HEADER.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"'{name}' is not a telemetry ring this reader understands")
+        schema = json.loads(bytes(self.shm.buf[_HEADER.size:_HEADER.size + schema_size]))
+        self.channels = schema['channels']
+        self.index = {channel: i for i, channel in enumerate(self.channels)}
+        self.capacity = capacity
+        self.block = block_rows(capacity)
+        self.times, self.data, self._count = _layout(self.shm.buf, channels, capacity, header_size)
+        self.times.flags.writeable = False
+        self.data.flags.writeable = False
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+    def is_open(self):
+        return struct.unpack_from('<I', self.shm.buf, _OPEN_OFFSET)[0] == 1
+
+    def since(self, seq, copy=True):
+        # Rows after sequence number seq, as (next_seq, times, rows). With
+        # copy=False the rows are views into the ring, limited to the part
+        # before the wrap point; call valid(seq) after using them to check
+        # that the writer has not overwritten them in the meantime.
+        # Rows the writer may be overwriting are left out.
+        stop = self.count
+        start = max(seq, stop - self.capacity + self.block)
+        if not copy:
+            i = start % self.capacity
+            stop = min(stop, start + self.capacity - i)
+            return stop, self.times[i:i + stop - start], self.data[i:i + stop - start]
+        idx = np.arange(start, stop) % self.capacity
+        times, rows = self.times[idx], self.data[idx]
+        # Rows the writer reached while we copied may be torn and are dropped
+        lapped = self.count - self.capacity + self.block - start
+        if lapped > 0:
+            times, rows = times[lapped:], rows[lapped:]
+        return stop, times, rows
+
+    def valid(self, seq):
+        return self.count - seq <= self.capacity - self.block
+
+    def latest(self):
+        _, times, rows = self.since(self.count - 1)
+        if len(times) == 0:
+            return None, None
+        return times[-1], rows[-1]
+
+    def close(self):
+        del self.times, self.data, self._count
+        self.shm.close()
+
+if __name__ == '__main__':
+    # Minimal consumer: report the row rate of a running publisher
+    import time
+    reader = SharedTelemetryReader(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_NAME)
+    print(f"{len(reader.channels)} channels: {', '.join(reader.channels)}")
+    seq = reader.count
+    try:
+        while reader.is_open():
+            time.sleep(1)
+            next_seq, times, rows = reader.since(seq)
+            print(f"{next_seq - seq} rows/s, latest {dict(zip(reader.channels[:3], rows[-1][:3])) if len(rows) else '-'}")
+            seq = next_seq
+    except KeyboardInterrupt:
+        pass
+    reader.close()
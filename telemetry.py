@@ -0,0 +1,150 @@
+import threading
+import numpy as np
+from sensor_interface import FRAME_FIELDS
+from resampling import resample, estimate_rate
+from rolling_stats import RollingStats
+
+class TelemetryStore:
+    # Ring buffer of aligned telemetry rows. Every row carries the monotonic
+    # time it was received and one value per channel (NaN for gaps). Rows are
+    # numbered by a sequence counter so consumers can fetch what they missed.
+    # Rolling statistics over stats_windows (seconds) and the whole session
+    # are folded in lazily: stats() catches up on the rows written since the
+    # last query, and the writer only does it when that backlog gets near the
+    # ring size, so no row is ever counted twice or missed.
+    # Time never goes backwards: consumers search it with searchsorted, so a
+    # row stamped before the previous one is moved up to it and counted in
+    # out_of_order.
+    def __init__(self, channels=FRAME_FIELDS, capacity=65536, stats_windows=(1.0, 10.0, 60.0)):
+        self.channels = list(channels)
+        self.index = {name: i for i, name in enumerate(self.channels)}
+        self.capacity = capacity
+        self.times = np.full(capacity, np.nan)
+        self.data = np.full((capacity, len(self.channels)), np.nan)
+        self.count = 0  # Total rows written, doubles as the next sequence number
+        self.last_time = -np.inf  # Time of the newest row
+        self.out_of_order = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._rolling = RollingStats(len(self.channels), stats_windows)
+        self._stats_seq = 0
+        self._stats_lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add_listener(self, callback):
+        # callback(times, rows) runs on the writer's thread after each append
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def append(self, t, row):
+        # Rows shorter than the channel list (e.g. a bare sensor frame without
+        # derived channels) are padded with NaN
+        full = np.full(len(self.channels), np.nan)
+        row = np.asarray(row, dtype=float)
+        full[:len(row)] = row
+        self.append_block(np.array([t], dtype=float), full[None, :])
+
+    def append_block(self, times, rows):
+        times = np.asarray(times, dtype=float)
+        rows = np.asarray(rows, dtype=float).reshape(len(times), len(self.channels))
+        with self._lock:
+            n = len(times)
+            if n == 0:
+                return
+            ordered = np.maximum.accumulate(np.maximum(times, self.last_time))
+            late = int(np.count_nonzero(ordered != times))
+            if late:
+                if not self.out_of_order:
+                    print(f"Warning: {late} telemetry rows stamped before earlier rows, moved up")
+                self.out_of_order += late
+                times = ordered
+            self.last_time = times[-1]
+            if n > self.capacity:
+                times, rows = times[-self.capacity:], rows[-self.capacity:]
+                self.count += n - self.capacity
+                n = self.capacity
+            start = self.count % self.capacity
+            first = min(n, self.capacity - start)
+            self.times[start:start + first] = times[:first]
+            self.data[start:start + first] = rows[:first]
+            if first < n:
+                self.times[:n - first] = times[first:]
+                self.data[:n - first] = rows[first:]
+            self.count += n
+            behind = self.count - self._stats_seq > self.capacity // 2
+        if behind:
+            self._update_stats()
+        for callback in self._listeners:
+            callback(times, rows)
+
+    def _update_stats(self):
+        with self._stats_lock:
+            self._stats_seq, times, rows = self.since(self._stats_seq)
+            self._rolling.add(times, rows)
+
+    def stats(self, seconds=None, channels=None):
+        # Per-channel count, mean, rms, std, min, max and ptp arrays over one
+        # of the stats_windows, or the whole session for None
+        self._update_stats()
+        with self._stats_lock:
+            summary = self._rolling.summary(seconds)
+        if channels is not None:
+            columns = [self.index[name] for name in channels]
+            summary = {name: values[columns] for name, values in summary.items()}
+        return summary
+
+    def reset_stats(self):
+        # Start the session statistics and windows over from the next row
+        with self._stats_lock:
+            self._stats_seq = self.count
+            self._rolling.reset()
+
+    def _slice(self, start, stop):
+        # Copy rows with sequence numbers [start, stop) out of the ring
+        idx = np.arange(start, stop) % self.capacity
+        return self.times[idx], self.data[idx]
+
+    def since(self, seq):
+        # Rows written after sequence number seq, as (next_seq, times, rows).
+        # Consumers that fell more than a full ring behind skip ahead.
+        with self._lock:
+            stop = self.count
+            start = max(seq, stop - self.capacity)
+            times, rows = self._slice(start, stop)
+        return stop, times, rows
+
+    def last(self, n):
+        with self._lock:
+            stop = self.count
+            start = max(0, stop - min(n, self.capacity))
+            return self._slice(start, stop)
+
+    def latest(self):
+        times, rows = self.last(1)
+        if len(times) == 0:
+            return None, None
+        return times[0], rows[0]
+
+    def channel(self, name, n=None):
+        times, rows = self.last(self.capacity if n is None else n)
+        return times, rows[:, self.index[name]]
+
+    def uniform(self, rate=None, seconds=None, channels=None, method='linear'):
+        # Uniform-rate view of the most recent data for plotting, spectra or
+        # export. rate defaults to the measured sample rate.
+        times, rows = self.last(self.capacity)
+        if seconds is not None and len(times):
+            keep = times >= times[-1] - seconds
+            times, rows = times[keep], rows[keep]
+        if channels is not None:
+            rows = rows[:, [self.index[name] for name in channels]]
+        if rate is None:
+            rate = estimate_rate(times)
+        if rate is None:
+            return np.empty(0), rows[:0]
+        return resample(times, rows, rate, method=method)
@@ -0,0 +1,336 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import sys
+import threading
+import warnings
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from sensor_interface import FRAME_FIELDS
+
+# Streams TelemetryStore rows to any number of local or LAN subscribers.
+#
+# Plain TCP / Unix socket: the client sends one JSON line with its
+# subscription, e.g. {"channels": ["pitch", "roll"], "decimate": 4,
+# "method": "mean"} (an empty line subscribes to every GyroSensor field),
+# and receives one JSON header line followed by binary batches.
+# WebSocket: connect to the same TCP port with the subscription in the
+# query string, e.g. ws://host:8765/?channels=pitch,roll&decimate=4; the
+# header arrives as a text message and every batch as a binary message.
+#
+# Batch: BATCH_HEADER (magic, store sequence number of the first row, row
+# count) followed by rows of little-endian float64: time, then the subscribed
+# channels in order. With decimation the sequence number is that of the first
+# source row; a jump in it means the server fell a whole ring behind.
+
+BATCH_MAGIC = b'MCTB'
+BATCH_HEADER = struct.Struct('<4sQI')
+DECIMATION_METHODS = ['pick', 'mean']
+MAX_WS_MESSAGE = 4096  # Clients only send control frames; larger ones are refused (1009)
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def parse_address(spec, default_host='127.0.0.1'):
+    # "PORT" or "HOST:PORT"
+    host, _, port = spec.rpartition(':')
+    return host or default_host, int(port)
+
+def _ws_frame(payload, opcode=0x2):
+    n = len(payload)
+    if n < 126:
+        head = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 65536:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return head + payload
+
+def _watch_done(task):
+    # Retrieve the reader's exception; a client hanging up is not an error
+    if task.cancelled():
+        return
+    e = task.exception()
+    if e is not None and not isinstance(e, (ConnectionError, asyncio.IncompleteReadError)):
+        print(f"Error reading from telemetry client: {e}")
+
+class Subscription:
+    # One client's view of the stream: channel selection, decimation state
+    # and a bounded queue of packed batches
+    def __init__(self, store, channels=None, decimate=1, method='pick', queue_size=64):
+        channels = list(FRAME_FIELDS if channels is None else channels)
+        unknown = [name for name in channels if name not in store.index]
+        if unknown:
+            raise ValueError(f"Unknown channels: {unknown}")
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"Unknown decimation method '{method}'")
+        self.channels = channels
+        self.columns = np.array([store.index[name] for name in channels], dtype=int)
+        self.decimate = max(1, int(decimate))
+        self.method = method
+        self.queue = asyncio.Queue(queue_size)
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.task = None
+        self._phase = 0
+        self._carry = None
+
+    def header(self):
+        return {
+            'channels': ['time'] + self.channels,
+            'dtype': '<f8',
+            'batch_header': BATCH_HEADER.format,
+            'magic': BATCH_MAGIC.decode(),
+            'decimate': self.decimate,
+            'method': self.method
+        }
+
+    def reduce(self, seq, times, rows):
+        # Rows starting at store sequence number seq; returns the sequence
+        # number of the first source row with the reduced times and values
+        values = rows[:, self.columns]
+        n = self.decimate
+        if n == 1:
+            return seq, times, values
+        if self.method == 'pick':
+            # Every n-th row, continuing the pattern across batches
+            first = (-self._phase) % n
+            self._phase = (self._phase + len(times)) % n
+            return seq + first, times[first::n], values[first::n]
+
+        # Block means over n rows; the remainder waits for the next batch
+        if self._carry is not None:
+            seq -= len(self._carry[0])
+            times = np.concatenate([self._carry[0], times])
+            values = np.concatenate([self._carry[1], values])
+        full = len(times) // n * n
+        self._carry = (times[full:], values[full:])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN gap blocks
+            return (seq, times[:full].reshape(-1, n).mean(axis=1),
+                    np.nanmean(values[:full].reshape(-1, n, len(self.channels)), axis=1))
+
+    def pack(self, seq, times, values):
+        payload = np.column_stack([times, values]).astype('<f8').tobytes()
+        return BATCH_HEADER.pack(BATCH_MAGIC, seq, len(times)) + payload
+
+class TelemetryServer:
+    # Runs its own asyncio loop on a background thread. Every interval the
+    # pump takes the new rows from the store and queues one batch per client;
+    # a client whose queue is full or whose socket stops draining is dropped,
+    # so no consumer can hold up acquisition or the other clients.
+    def __init__(self, store, host='127.0.0.1', port=8765, unix_path=None, interval=0.05,
+                 queue_size=64, send_timeout=2.0):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.interval = interval
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.clients = set()
+        self._clients_lock = threading.Lock()  # stats() reads clients from other threads
+        self.dropped = 0
+        self.loop = None
+        self._thread = None
+        self._servers = []
+        self._pump_task = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(self._serve(), self.loop)
+        try:
+            future.result(timeout=5)
+        except Exception:
+            self.stop()
+            raise
+
+    def stop(self):
+        if self._thread is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        try:
+            future.result(timeout=2)
+        except Exception as e:
+            print(f"Error stopping telemetry server: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
+        self._thread = None
+
+    async def _serve(self):
+        if self.port is not None:
+            self._servers.append(await asyncio.start_server(self._client, self.host, self.port))
+            print(f"Telemetry server listening on {self.host}:{self.port}")
+        if self.unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._client, self.unix_path))
+            print(f"Telemetry server listening on {self.unix_path}")
+        self._pump_task = asyncio.get_running_loop().create_task(self._pump())
+
+    async def _shutdown(self):
+        for server in self._servers:
+            server.close()
+        with self._clients_lock:
+            tasks = [client.task for client in self.clients] + [self._pump_task]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*[task for task in tasks if task is not None], return_exceptions=True)
+        self._servers.clear()
+
+    async def _pump(self):
+        seq = self.store.count
+        while True:
+            await asyncio.sleep(self.interval)
+            seq, times, rows = self.store.since(seq)
+            if len(times) == 0:
+                continue
+            first = seq - len(times)
+            for client in list(self.clients):
+                batch_seq, reduced_times, values = client.reduce(first, times, rows)
+                if len(reduced_times) == 0:
+                    continue
+                try:
+                    client.queue.put_nowait(client.pack(batch_seq, reduced_times, values))
+                except asyncio.QueueFull:
+                    self._drop(client, "queue full")
+
+    def _drop(self, client, reason):
+        if client in self.clients:
+            with self._clients_lock:
+                self.clients.discard(client)
+            self.dropped += 1
+            print(f"Dropping telemetry client: {reason}")
+            client.task.cancel()
+
+    async def _client(self, reader, writer):
+        websocket = False
+        try:
+            first = await asyncio.wait_for(reader.readline(), 5)
+            if first.startswith(b'GET '):
+                websocket = True
+                params = await self._handshake(first, reader, writer)
+            else:
+                params = json.loads(first) if first.strip() else {}
+            client = Subscription(self.store, queue_size=self.queue_size, **params)
+        except (ValueError, TypeError, asyncio.TimeoutError, ConnectionError) as e:
+            message = json.dumps({'error': str(e)}).encode()
+            writer.write(_ws_frame(message, 0x1) if websocket else message + b'\n')
+            writer.close()
+            return
+
+        frame = (lambda data, opcode=0x2: _ws_frame(data, opcode)) if websocket else \
+            (lambda data, opcode=None: data)
+        header = json.dumps(client.header()).encode()
+        writer.write(frame(header, 0x1) if websocket else header + b'\n')
+        client.task = asyncio.current_task()
+        with self._clients_lock:
+            self.clients.add(client)
+        loop = asyncio.get_running_loop()
+        watch = loop.create_task(self._watch(reader, writer, websocket))
+        watch.add_done_callback(_watch_done)
+        get = None
+        try:
+            while not watch.done():
+                get = loop.create_task(client.queue.get())
+                await asyncio.wait([get, watch], return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    break
+                data = get.result()
+                writer.write(frame(data))
+                await asyncio.wait_for(writer.drain(), self.send_timeout)
+                client.rows_sent += (len(data) - BATCH_HEADER.size) // (8 * (1 + len(client.channels)))
+                client.bytes_sent += len(data)
+        except asyncio.TimeoutError:
+            self._drop(client, "not reading")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            with self._clients_lock:
+                self.clients.discard(client)
+            for task in (get, watch):
+                if task is not None:
+                    task.cancel()
+            writer.close()
+
+    async def _handshake(self, request_line, reader, writer):
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), 5)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if key is None:
+            raise ValueError("Not a WebSocket request")
+        accept = base64.b64encode(hashlib.sha1(key.encode() + _WS_GUID).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+        query = parse_qs(urlsplit(request_line.split()[1].decode()).query)
+        params = {}
+        if 'channels' in query:
+            params['channels'] = query['channels'][0].split(',')
+        if 'decimate' in query:
+            params['decimate'] = int(query['decimate'][0])
+        if 'method' in query:
+            params['method'] = query['method'][0]
+        return params
+
+    async def _watch(self, reader, writer, websocket):
+        # Returns when the client goes away; answers WebSocket pings
+        while True:
+            if not websocket:
+                if not await reader.read(4096):
+                    return
+                continue
+            head = await reader.readexactly(2)
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await reader.readexactly(8))[0]
+            if length > MAX_WS_MESSAGE:
+                writer.write(_ws_frame(struct.pack('!H', 1009), 0x8))  # Message too big
+                return
+            mask = await reader.readexactly(4) if head[1] & 0x80 else b'\0\0\0\0'
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+            if opcode == 0x8:
+                writer.write(_ws_frame(payload[:2], 0x8))
+                return
+            if opcode == 0x9:
+                writer.write(_ws_frame(payload, 0xA))
+
+    def stats(self):
+        with self._clients_lock:
+            clients = list(self.clients)
+        return {'clients': len(clients), 'dropped': self.dropped,
+                'rows_sent': sum(client.rows_sent for client in clients),
+                'bytes_sent': sum(client.bytes_sent for client in clients)}
+
+if __name__ == '__main__':
+    # Minimal TCP subscriber: telemetry_server.py [HOST:]PORT [channel,...]
+    import socket
+    import time
+    host, port = parse_address(sys.argv[1] if len(sys.argv) > 1 else '8765')
+    request = {'channels': sys.argv[2].split(',')} if len(sys.argv) > 2 else {}
+    sock = socket.create_connection((host, port))
+    sock.sendall(json.dumps(request).encode() + b'\n')
+    stream = sock.makefile('rb')
+    header = json.loads(stream.readline())
+    if 'error' in header:
+        sys.exit(header['error'])
+    width = len(header['channels'])
+    print(f"Subscribed to {', '.join(header['channels'])}")
+    rows, started = 0, time.monotonic()
+    while True:
+        magic, seq, n = BATCH_HEADER.unpack(stream.read(BATCH_HEADER.size))
+        batch = np.frombuffer(stream.read(8 * width * n), '<f8').reshape(n, width)
+        rows += n
+        if time.monotonic() - started >= 1:
+            print(f"{rows} rows/s, latest {batch[-1]}")
+            rows, started = 0, time.monotonic()
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Tracks a few known frequencies (commutation, gear mesh, ...) without a full
+# FFT per frame. A sliding DFT keeps one complex bin per channel and frequency
+# over the last `window` samples: each sample adds its term x * exp(-j w t)
+# and drops the one that left the window, O(1) per sample and bin. Terms use
+# the samples' own timestamps, so jittery arrival times need no resampling.
+# The window mean is taken out of each bin (using a sliding sum of the bare
+# phasors), so a large offset such as an encoder position does not leak into
+# the tracked frequencies. The sums are rebuilt from the stored terms once
+# per window to stop rounding errors from accumulating.
+
+class SlidingDFT:
+    def __init__(self, channels, frequencies, window=256):
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.omega = 2 * np.pi * self.frequencies
+        self.window = window
+        shape = (channels, len(self.frequencies))
+        self.terms = np.zeros((window,) + shape, dtype=complex)  # Ring of per-sample terms
+        self.phasors = np.zeros((window,) + shape, dtype=complex)  # exp(-j w t) where finite
+        self.values = np.zeros((window, channels))
+        self.valid = np.zeros((window, channels))                # 1 where the sample was finite
+        self.pos = 0
+        self.bins = np.zeros(shape, dtype=complex)
+        self.basis = np.zeros(shape, dtype=complex)
+        self.total = np.zeros(channels)
+        self.count = np.zeros(channels)
+        self.since_resync = 0
+
+    def update(self, times, values):
+        # values is (samples, channels); returns magnitude and phase as
+        # (samples, channels, frequencies) arrays, one per input sample
+        n = len(times)
+        if n > self.window:
+            # Every term dropped from the ring must still be in it, so long
+            # blocks go through in window-sized pieces
+            head_mag, head_phase = self.update(times[:-self.window], values[:-self.window])
+            tail_mag, tail_phase = self.update(times[-self.window:], values[-self.window:])
+            return np.concatenate([head_mag, tail_mag]), np.concatenate([head_phase, tail_phase])
+
+        finite = np.isfinite(values)
+        values = np.where(finite, values, 0.0)
+        phasors = finite[:, :, None] * np.exp(-1j * times[:, None, None] * self.omega)
+        terms = values[:, :, None] * phasors
+
+        # Terms leaving the window as each new one arrives
+        slots = (self.pos + np.arange(n)) % self.window
+        bins = self.bins + np.cumsum(terms - self.terms[slots], axis=0)
+        basis = self.basis + np.cumsum(phasors - self.phasors[slots], axis=0)
+        total = self.total + np.cumsum(values - self.values[slots], axis=0)
+        count = self.count + np.cumsum(finite - self.valid[slots], axis=0)
+        self.terms[slots] = terms
+        self.phasors[slots] = phasors
+        self.values[slots] = values
+        self.valid[slots] = finite
+        self.pos = (self.pos + n) % self.window
+
+        self.since_resync += n
+        if self.since_resync >= self.window:
+            self.since_resync = 0
+            self.bins = self.terms.sum(axis=0)
+            self.basis = self.phasors.sum(axis=0)
+            self.total = self.values.sum(axis=0)
+            self.count = self.valid.sum(axis=0)
+        else:
+            self.bins = bins[-1]
+            self.basis = basis[-1]
+            self.total = total[-1]
+            self.count = count[-1]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            count = count[:, :, None]
+            bins = bins - total[:, :, None] / count * basis
+            # Amplitude of a sinusoid at the tracked frequency, phase relative
+            # to each sample's own time
+            magnitude = np.where(count > 0, 2 * np.abs(bins) / count, np.nan)
+        phase = np.angle(bins * np.exp(1j * times[:, None, None] * self.omega))
+        return magnitude, np.where(np.isfinite(magnitude), phase, np.nan)
+
+    def reset(self):
+        for state in (self.terms, self.phasors, self.values, self.valid,
+                      self.bins, self.basis, self.total, self.count):
+            state[:] = 0
+        self.since_resync = 0
+
+def tone_channel(name, frequency):
+    return f"{name}_{frequency:g}hz"
+
+def parse_track_spec(spec):
+    # "CHANNEL[,CHANNEL...]:FREQ[,FREQ...]", e.g. "speed1,speed2:12.5,25"
+    channels, _, frequencies = spec.partition(':')
+    if not channels or not frequencies:
+        raise ValueError(f"Tracking spec '{spec}' should be CHANNEL[,...]:FREQ[,...]")
+    return channels.split(','), [float(f) for f in frequencies.split(',')]
+
+class ToneStage:
+    # Acquisition stage: magnitude and phase of the tracked frequencies as
+    # extra channels <input>_<f>hz and <input>_<f>hz_phase, so plots, logs,
+    # subscribers and alarm rules can use them like any other channel
+    def __init__(self, inputs, frequencies, window=256):
+        self.inputs = list(inputs)
+        self.frequencies = list(frequencies)
+        self.outputs = [tone_channel(name, f) + suffix
+                        for suffix in ['', '_phase'] for name in self.inputs for f in self.frequencies]
+        self.dft = SlidingDFT(len(self.inputs), self.frequencies, window)
+
+    def bind(self, index):
+        self.input_idx = [index[name] for name in self.inputs]
+        self.output_idx = [index[name] for name in self.outputs]
+
+    def process(self, times, rows):
+        magnitude, phase = self.dft.update(times, rows[:, self.input_idx])
+        rows[:, self.output_idx] = np.concatenate(
+            [magnitude.reshape(len(times), -1), phase.reshape(len(times), -1)], axis=1)
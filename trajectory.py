@@ -0,0 +1,166 @@
+import numpy as np
+
+# Synchronized multi-axis motion profiles. Every axis of a move follows the
+# same normalized shape s(tau), tau = t / duration, scaled by its own travel,
+# so all motors start and finish together. The shape comes from the axis
+# that needs the longest time; the duration is then stretched until every
+# axis respects its own velocity, acceleration and jerk limits.
+
+PROFILES = ['scurve', 'trapezoid']
+
+def _segments(fa, fj):
+    # Normalized position shape over tau in [0, 1]: accelerate for fa, cruise,
+    # decelerate for fa. fj is the fraction of each accel phase spent ramping
+    # the acceleration (0 = trapezoid). Returns segment durations, start
+    # accelerations and jerks, the peak velocity/accel/jerk factors and the
+    # initial slope.
+    peak_v = 1.0 / (1.0 - fa)
+    peak_a = peak_v / (fa * (1.0 - fj)) if fa > 0 else 0.0
+    peak_j = peak_a / (fj * fa) if fj > 0 and fa > 0 else 0.0
+    ramp, hold = fj * fa, (1.0 - 2.0 * fj) * fa
+    durations = np.array([ramp, hold, ramp, 1.0 - 2.0 * fa, ramp, hold, ramp])
+    accels = np.array([0.0, peak_a, peak_a, 0.0, 0.0, -peak_a, -peak_a]) if fj > 0 else \
+        np.array([peak_a, peak_a, peak_a, 0.0, -peak_a, -peak_a, -peak_a])
+    jerks = np.array([peak_j, 0.0, -peak_j, 0.0, -peak_j, 0.0, peak_j])
+    return durations, accels, jerks, (peak_v, peak_a, peak_j), 0.0
+
+def _ramp_segments(fj):
+    # Normalized velocity-change shape over tau in [0, 1], one derivative
+    # lower than _segments: the evaluated value is the velocity, its slope
+    # the acceleration (ramped over fj at both ends, constant for trapezoid)
+    peak_a = 1.0 / (1.0 - fj)
+    peak_j = peak_a / fj if fj > 0 else 0.0
+    durations = np.array([fj, 1.0 - 2.0 * fj, fj])
+    jerks = np.array([peak_j, 0.0, -peak_j])
+    return durations, jerks, np.zeros(3), (1.0, peak_a, peak_j), 0.0 if fj > 0 else peak_a
+
+def _evaluate(durations, accels, jerks, tau, v_start=0.0):
+    # Integrate piecewise-constant jerk: state at each segment start in a
+    # short scalar pass, then every sample evaluated at once
+    starts = np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+    p0 = np.zeros(len(durations))
+    v0 = np.zeros(len(durations))
+    p, v = 0.0, v_start
+    for k, (d, a, j) in enumerate(zip(durations, accels, jerks)):
+        p0[k], v0[k] = p, v
+        p += v * d + a * d * d / 2 + j * d ** 3 / 6
+        v += a * d + j * d * d / 2
+    k = np.clip(np.searchsorted(starts, tau, side='right') - 1, 0, len(durations) - 1)
+    dt = tau - starts[k]
+    s = p0[k] + v0[k] * dt + accels[k] * dt ** 2 / 2 + jerks[k] * dt ** 3 / 6
+    ds = v0[k] + accels[k] * dt + jerks[k] * dt ** 2 / 2
+    return s, ds
+
+def _accel_phase(speed, a_max, j_max, profile):
+    # Duration and jerk-ramp time of reaching `speed` from rest (per axis)
+    if profile == 'trapezoid':
+        return speed / a_max, np.zeros_like(speed)
+    full = speed * j_max >= a_max ** 2  # Axes that reach full acceleration
+    tj = np.where(full, a_max / j_max, np.sqrt(speed / j_max))
+    ta = np.where(full, speed / a_max + a_max / j_max, 2 * tj)
+    return ta, tj
+
+class Trajectory:
+    # Precomputed setpoints sampled at a fixed rate: values (samples, axes)
+    # plus their time derivatives. kind is 'position' or 'velocity'.
+    def __init__(self, kind, rate, values, rates, duration):
+        self.kind = kind
+        self.rate = rate
+        self.values = values
+        self.rates = rates
+        self.duration = duration
+
+    def __len__(self):
+        return len(self.values)
+
+    def times(self):
+        return np.arange(len(self.values)) / self.rate
+
+    def sample(self, t):
+        # Setpoint row for elapsed time t; holds the final row afterwards
+        i = min(max(int(t * self.rate), 0), len(self.values) - 1)
+        return self.values[i], self.rates[i]
+
+    def finished(self, t):
+        return t >= self.duration
+
+def _limit_arrays(n, *limits):
+    return [np.broadcast_to(np.asarray(limit, dtype=float), (n,)) for limit in limits]
+
+def _sample(shape, duration, rate, start, travel):
+    durations, accels, jerks, _, v_start = shape
+    count = int(np.ceil(duration * rate)) + 1 if duration > 0 else 1
+    tau = np.minimum(np.arange(count) / rate / duration, 1.0) if duration > 0 else np.ones(1)
+    s, ds = _evaluate(durations, accels, jerks, tau, v_start)
+    values = start[None, :] + s[:, None] * travel[None, :]
+    rates = ds[:, None] * travel[None, :] / duration if duration > 0 else np.zeros((1, len(start)))
+    return values, rates
+
+def plan_move(start, target, v_max, a_max, j_max=None, profile='scurve', rate=500.0):
+    # Point-to-point move for all axes at once, arriving together
+    start = np.asarray(start, dtype=float)
+    travel = np.asarray(target, dtype=float) - start
+    distance = np.abs(travel)
+    v_max, a_max, j_max = _limit_arrays(len(start), v_max, a_max,
+                                        np.inf if j_max is None else j_max)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile '{profile}'")
+    if profile == 'scurve' and not np.isfinite(j_max).all():
+        raise ValueError("S-curve profiles need a jerk limit")
+
+    # Fastest profile per axis: cap the peak speed where accel + decel would
+    # overshoot the travel (bisection, vectorized across axes)
+    speed = v_max.copy()
+    ta, tj = _accel_phase(speed, a_max, j_max, profile)
+    short = speed * ta > distance
+    lo, hi = np.zeros_like(speed), speed.copy()
+    for _ in range(60):
+        if not short.any():
+            break
+        mid = (lo + hi) / 2
+        ta_mid, _ = _accel_phase(mid, a_max, j_max, profile)
+        fits = mid * ta_mid <= distance
+        lo = np.where(short & fits, mid, lo)
+        hi = np.where(short & ~fits, mid, hi)
+    speed = np.where(short, lo, speed)
+    ta, tj = _accel_phase(speed, a_max, j_max, profile)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        times = np.where(distance > 0, distance / speed + ta, 0.0)
+
+    lead = int(np.argmax(times))
+    if times[lead] <= 0:
+        return Trajectory('position', rate, start[None, :], np.zeros((1, len(start))), 0.0)
+    fa = min(ta[lead] / times[lead], 0.5)
+    fj = min(tj[lead] / ta[lead], 0.5) if ta[lead] > 0 else 0.0
+    shape = _segments(fa, fj)
+
+    # Stretch until every axis is within its limits under the common shape
+    peak_v, peak_a, peak_j = shape[3]
+    duration = np.max(np.maximum.reduce([
+        distance * peak_v / v_max,
+        np.sqrt(distance * peak_a / a_max),
+        np.cbrt(distance * peak_j / j_max)
+    ]))
+    values, rates = _sample(shape, duration, rate, start, travel)
+    return Trajectory('position', rate, values, rates, duration)
+
+def plan_velocity(start, target, a_max, j_max=None, profile='scurve', rate=50.0):
+    # Velocity change for all axes at once, reaching the targets together
+    start = np.asarray(start, dtype=float)
+    change = np.asarray(target, dtype=float) - start
+    a_max, j_max = _limit_arrays(len(start), a_max, np.inf if j_max is None else j_max)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile '{profile}'")
+
+    times, tj = _accel_phase(np.abs(change), a_max, j_max, profile)
+    lead = int(np.argmax(times))
+    if times[lead] <= 0:
+        return Trajectory('velocity', rate, start[None, :], np.zeros((1, len(start))), 0.0)
+    fj = min(tj[lead] / times[lead], 0.5)
+    shape = _ramp_segments(fj)
+
+    _, peak_a, peak_j = shape[3]
+    distance = np.abs(change)
+    duration = np.max(np.maximum(distance * peak_a / a_max, np.sqrt(distance * peak_j / j_max)))
+    values, rates = _sample(shape, duration, rate, start, change)
+    return Trajectory('velocity', rate, values, rates, duration)